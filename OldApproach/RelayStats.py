@@ -1,14 +1,13 @@
+import argparse
 import os
 import requests
 import sys
 from datetime import datetime, timedelta, timezone
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import openpyxl
 from io import BytesIO
-from statsmodels.tsa.stattools import acf, pacf
-from scipy.stats import iqr
+
+# Stage profiling hooks shared with the daily scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'newApproachDAILY'))
+from profiling import PROFILER, add_profile_arguments, finish_profiling, start_profiling
 
 def fetch_bandwidth_history(fingerprint):
     url = f"https://onionoo.torproject.org/bandwidth?lookup={fingerprint}"
@@ -45,6 +44,7 @@ def extract_recent_bandwidth(history, months=6):
     return recent_history
 
 def load_data(fingerprint, months=6):
+    import pandas as pd
     write_history, read_history = fetch_bandwidth_history(fingerprint)
 
     recent_write_history = extract_recent_bandwidth(write_history, months)
@@ -64,6 +64,9 @@ def load_data(fingerprint, months=6):
     return data
 
 def calculate_statistics(data):
+    import numpy as np
+    from statsmodels.tsa.stattools import acf, pacf
+    from scipy.stats import iqr
     stats = {}
     
     # Separate read and write data
@@ -106,6 +109,7 @@ def calculate_statistics(data):
     return stats
 
 def plot_bandwidth(data):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 4))
     
     for dtype in ['Read', 'Write']:
@@ -127,6 +131,7 @@ def plot_bandwidth(data):
     return buf
 
 def plot_histogram(data):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 4))
     
     for dtype in ['Read', 'Write']:
@@ -148,6 +153,7 @@ def plot_histogram(data):
     return buf
 
 def plot_scatter(data):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 4))
     
     read_data = data[data['Type'] == 'Read']
@@ -170,6 +176,7 @@ def plot_scatter(data):
     return buf
 
 def plot_acf_pacf(acf_values, pacf_values, relay_name, bandwidth_type):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 5))
     plt.subplot(121)
     plt.stem(acf_values)
@@ -187,6 +194,8 @@ def plot_acf_pacf(acf_values, pacf_values, relay_name, bandwidth_type):
     return buf
 
 def save_statistics_to_excel(stats, data, writer, relay_name):
+    import pandas as pd
+    import openpyxl.drawing.image
     # Save statistics
     stats_df = pd.DataFrame(stats).T
     stats_startrow = 1
@@ -220,10 +229,12 @@ def save_statistics_to_excel(stats, data, writer, relay_name):
 def analyze_relay(fingerprint, relay_name, writer):
     try:
         # Load data
-        data = load_data(fingerprint)
+        with PROFILER.stage('fetch'):
+            data = load_data(fingerprint)
         
         # Calculate statistics
-        stats = calculate_statistics(data)
+        with PROFILER.stage('stats'):
+            stats = calculate_statistics(data)
         
         # Print statistics to console
         for dtype, stat in stats.items():
@@ -235,12 +246,14 @@ def analyze_relay(fingerprint, relay_name, writer):
                     print(f"{k}: {v:.2f}")
         
         # Save statistics, data, and plots to Excel
-        save_statistics_to_excel(stats, data, writer, relay_name)
+        with PROFILER.stage('excel'):
+            save_statistics_to_excel(stats, data, writer, relay_name)
 
     except Exception as e:
         print(f"Failed to analyze relay {relay_name} with fingerprint {fingerprint}: {e}")
 
 def create_summary_sheet(writer, all_stats):
+    import pandas as pd
     if not all_stats:
         return
 
@@ -295,6 +308,8 @@ def create_summary_sheet(writer, all_stats):
     plot_statistics(writer, summary_stats_df, 'Frequency of Outliers', 'Frequency of Outliers for Each Relay', 'B225')
 
 def plot_statistics(writer, summary_stats_df, column, title, position):
+    import matplotlib.pyplot as plt
+    import openpyxl.drawing.image
     plt.figure(figsize=(10, 6))
     plt.bar(summary_stats_df['Relay'], summary_stats_df[column])
     plt.title(title)
@@ -313,11 +328,16 @@ def plot_statistics(writer, summary_stats_df, column, title, position):
     worksheet.add_image(img, position)
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_bandwidth.py <input_excel_filename>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Analyze bandwidth for the relays listed in an Excel file.')
+    parser.add_argument('input_excel_filename', help='Excel file with Fingerprint and Relay Name columns.')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    # Heavy libraries are imported by the functions that need them, so --help returns immediately
+    import pandas as pd
     
-    input_excel_filename = sys.argv[1]
+    input_excel_filename = args.input_excel_filename
     output_excel_filename = "Relays_Analysis.xlsx"
     
     relays_df = pd.read_excel(input_excel_filename)
@@ -333,16 +353,20 @@ def main():
             print(f"\nAnalyzing {relay_name} with fingerprint {fingerprint}...\n")
             try:
                 analyze_relay(fingerprint, relay_name, writer)
-                data = load_data(fingerprint)
-                stats = calculate_statistics(data)
+                with PROFILER.stage('fetch'):
+                    data = load_data(fingerprint)
+                with PROFILER.stage('stats'):
+                    stats = calculate_statistics(data)
                 all_stats[relay_name] = stats
             except Exception as e:
                 print(f"Error processing relay {relay_name} with fingerprint {fingerprint}: {e}")
         
-        create_summary_sheet(writer, all_stats)
+        with PROFILER.stage('excel'):
+            create_summary_sheet(writer, all_stats)
         
         # Remove the dummy sheet
         del writer.book["DummySheet"]
+    finish_profiling(args)
 
 if __name__ == "__main__":
     main()
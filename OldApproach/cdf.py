@@ -2,13 +2,7 @@ import os
 import requests
 import sys
 from datetime import datetime, timedelta, timezone
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import openpyxl
 from io import BytesIO
-from statsmodels.tsa.stattools import acf, pacf
-from scipy.stats import iqr
 
 def fetch_bandwidth_history(fingerprint):
     url = f"https://onionoo.torproject.org/bandwidth?lookup={fingerprint}"
@@ -49,6 +43,7 @@ def extract_recent_bandwidth(history, months=6):
     return recent_history
 
 def load_data(fingerprint, months=6):
+    import pandas as pd
     write_history, read_history, advertised_bandwidth = fetch_bandwidth_history(fingerprint)
 
     recent_write_history = extract_recent_bandwidth(write_history, months)
@@ -68,6 +63,9 @@ def load_data(fingerprint, months=6):
     return data, advertised_bandwidth
 
 def calculate_statistics(data):
+    import numpy as np
+    from statsmodels.tsa.stattools import acf, pacf
+    from scipy.stats import iqr
     stats = {}
     means = []
     std_devs = []
@@ -108,6 +106,8 @@ def calculate_statistics(data):
     return stats, means, std_devs, coefs_of_var
 
 def plot_cdf(data, title, xlabel):
+    import numpy as np
+    import matplotlib.pyplot as plt
     sorted_data = np.sort(data)
     cdf = np.arange(1, len(sorted_data) + 1) / len(sorted_data)
 
@@ -126,6 +126,7 @@ def plot_cdf(data, title, xlabel):
     return buf
 
 def plot_bandwidth(data):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 4))
     
     for dtype in ['Read', 'Write']:
@@ -147,6 +148,7 @@ def plot_bandwidth(data):
     return buf
 
 def plot_scatter(data):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 4))
     
     read_data = data[data['Type'] == 'Read']
@@ -169,6 +171,7 @@ def plot_scatter(data):
     return buf
 
 def plot_acf_pacf(acf_values, pacf_values, relay_name, bandwidth_type):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 5))
     plt.subplot(121)
     plt.stem(acf_values)
@@ -186,6 +189,8 @@ def plot_acf_pacf(acf_values, pacf_values, relay_name, bandwidth_type):
     return buf
 
 def save_statistics_to_excel(stats, data, writer, relay_name):
+    import pandas as pd
+    import openpyxl.drawing.image
     # Save statistics
     stats_df = pd.DataFrame(stats).T
     stats_startrow = 1
@@ -239,6 +244,7 @@ def analyze_relay(fingerprint, relay_name, writer):
         return [], [], [], None
 
 def create_summary_sheet(writer, means, std_devs, coefs_of_var, advertised_bandwidths):
+    import openpyxl.drawing.image
     if not means and not std_devs and not coefs_of_var and not advertised_bandwidths:
         return
 
@@ -262,6 +268,8 @@ def main():
         print("Usage: python analyze_bandwidth.py <input_excel_filename>")
         sys.exit(1)
     
+    # Heavy libraries are imported by the functions that need them, so a usage error returns immediately
+    import pandas as pd
     input_excel_filename = sys.argv[1]
     output_excel_filename = "Relays_Analysis_CDF.xlsx"
     
@@ -1,15 +1,24 @@
-import requests
+import argparse
+import os
+import sys
 from datetime import datetime, timezone, timedelta
-import pandas as pd
 import time
 
-def fetch_all_bandwidth_data():
+# Share the Onionoo query builder with the daily scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'newApproachDAILY'))
+from onionoo import (BANDWIDTH_FIELDS, add_client_arguments, add_query_arguments, build_query_url,
+                     client_options_from_args, open_session, query_params_from_args)
+
+def fetch_all_bandwidth_data(query_params=None, client_options=None):
     limit = 5000  # Maximum allowed by the Onionoo API
     offset = 0
     all_bandwidth_data = []
+    if query_params is None:
+        query_params = {'type': 'relay', 'fields': BANDWIDTH_FIELDS}
+    session = open_session(client_options)
     while True:
-        url = f'https://onionoo.torproject.org/bandwidth?type=relay&limit={limit}&offset={offset}'
-        response = requests.get(url)
+        url = build_query_url('bandwidth', limit=limit, offset=offset, **query_params)
+        response = session.get(url)
         if response.status_code != 200:
             raise Exception(f"Failed to fetch bandwidth data: {response.status_code}")
         data = response.json()
@@ -24,6 +33,7 @@ def fetch_all_bandwidth_data():
     return all_bandwidth_data
 
 def extract_bandwidth_data(relay):
+    import pandas as pd
     fingerprint = relay.get('fingerprint')
     write_history = relay.get('write_history')
     read_history = relay.get('read_history')
@@ -64,8 +74,14 @@ def extract_bandwidth_data(relay):
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Fetch monthly bandwidth histories for all relays and compute CoV.')
+    add_query_arguments(parser, default_fields=BANDWIDTH_FIELDS, default_type='relay')
+    add_client_arguments(parser)
+    args = parser.parse_args()
+    import pandas as pd  # Loaded after argument parsing so --help stays fast
+
     print("Fetching bandwidth data for all relays...")
-    all_bandwidth_data = fetch_all_bandwidth_data()
+    all_bandwidth_data = fetch_all_bandwidth_data(query_params_from_args(args), client_options_from_args(args))
     all_data_points = []
     relay_count = 0  # Counter for relays with data
     print("Extracting bandwidth data...")
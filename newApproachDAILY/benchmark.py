@@ -0,0 +1,303 @@
+# benchmark.py
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+STAGES = ['extract', 'extract_columns', 'stats', 'stats_batches', 'cdf', 'excel', 'stream_budget']
+DEFAULT_SIZES = [100, 1000, 5000]
+BASELINE_FILE = 'benchmark_baseline.json'
+
+# Entry points timed by --startup, with the arguments that make them exit right after loading
+# and the exit status that means they loaded cleanly
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENTRY_POINTS = [
+    ('newApproachDAILY/fetch_data.py', ['--help'], 0),
+    ('newApproachDAILY/calculate.py', ['--help'], 0),
+    ('newApproachDAILY/visualize.py', ['--help'], 0),
+    ('newApproachDAILY/query_fingerprints.py', ['--help'], 0),
+    ('newApproachDAILY/pipeline.py', ['--help'], 0),
+    ('newApproach-MON/dataCollectionMONTH.py', ['--help'], 0),
+    ('OldApproach/RelayStats.py', ['--help'], 0),
+    ('OldApproach/cdf.py', [], 1),  # Prints its usage line and exits with 1
+]
+
+# Fixed clock so every run extracts the same rows from the same synthetic documents
+BENCHMARK_NOW = datetime(2024, 10, 1, tzinfo=timezone.utc)
+
+class RssSampler:
+    # Tracks the high-water mark of resident memory while a stage runs. Sampling
+    # /proc lets us report the stage's own growth instead of the process-lifetime
+    # peak that getrusage gives; other platforms fall back to ru_maxrss.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.available = os.path.exists('/proc/self/statm')
+        self.peak = self.start = self.current()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def current(self):
+        if self.available:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self.page_size
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def run(self):
+        while not self.stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.current())
+
+def synthetic_histories(relays, seed=0):
+    import synthetic
+    return [synthetic.bandwidth_document(i, seed, BENCHMARK_NOW) for i in range(relays)]
+
+def benchmark_window():
+    cutoff_start = BENCHMARK_NOW - timedelta(days=60)
+    return cutoff_start, cutoff_start + timedelta(days=30)
+
+def extracted_rows(documents):
+    import fetch_data
+    start, end = benchmark_window()
+    rows = []
+    for doc in documents:
+        rows += fetch_data.extract_daily_bandwidth_data(doc['write_history'], start, end, "Write", doc['fingerprint'])
+        rows += fetch_data.extract_daily_bandwidth_data(doc['read_history'], start, end, "Read", doc['fingerprint'])
+    return rows
+
+def prepare_stage(stage, relays, seed):
+    # Build the stage's input outside the measured region; returns (callable, rows processed)
+    import pandas as pd
+    import fetch_data
+    documents = synthetic_histories(relays, seed)
+    start, end = benchmark_window()
+
+    if stage == 'extract':
+        rows = len(extracted_rows(documents))
+        return (lambda: extracted_rows(documents)), rows
+
+    if stage == 'extract_columns':
+        rows = len(extracted_rows(documents))
+        def run():
+            return [fetch_data.relay_columns(doc['fingerprint'], (doc['write_history'], doc['read_history']), start, end)
+                    for doc in documents]
+        return run, rows
+
+    if stage == 'stream_budget':
+        # fetch_data.py --stream --time-budget against an in-process stand-in, on at most 1000 relays;
+        # a run that fetches fewer relays than asked for is reported as an error
+        import onionoo_standin
+        config = onionoo_standin.StandinConfig(relays=min(relays, 1000), seed=seed)
+        server, base_url = onionoo_standin.start_standin(config)
+        output = os.path.join(tempfile.mkdtemp(), 'stream.csv')
+        def run():
+            fetched = fetch_data.fetch_bandwidth_data_streaming(config.fingerprints, output, time_budget=3600,
+                                                                client_options={'base_urls': [base_url]})
+            if len(fetched) != len(config.fingerprints):
+                raise RuntimeError(f"time-boxed stream fetched {len(fetched)}/{len(config.fingerprints)} relays")
+        run()  # Warm up and count the rows written
+        with open(output) as f:
+            return run, sum(1 for _ in f) - 1
+
+    import calculate
+    df = pd.DataFrame(extracted_rows(documents))
+    if stage == 'stats':
+        return (lambda: calculate.calculate_statistics(df)), len(df)
+
+    if stage == 'stats_batches':
+        batches = [fetch_data.relay_columns(doc['fingerprint'], (doc['write_history'], doc['read_history']), start, end)
+                   for doc in documents]
+        batches = [batch for batch in batches if batch is not None]
+        return (lambda: calculate.calculate_statistics_from_batches(batches)), len(df)
+
+    stats_df = calculate.calculate_statistics(df)
+    if stage == 'cdf':
+        import matplotlib
+        matplotlib.use('Agg')
+        import visualize
+        output_dir = tempfile.mkdtemp()
+        def run():
+            visualize.plot_relay_statistics(stats_df, cov_output=os.path.join(output_dir, 'cov.png'),
+                                            std_output=os.path.join(output_dir, 'std.png'))
+        return run, len(stats_df)
+
+    if stage == 'excel':
+        # The per-relay Excel report from OldApproach/RelayStats.py; each relay gets its own sheet,
+        # so it is benchmarked on at most 20 relays
+        import matplotlib
+        matplotlib.use('Agg')
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'OldApproach'))
+        import RelayStats
+        frames = []
+        for fingerprint, group in list(df.groupby('Fingerprint'))[:20]:
+            data = group.rename(columns={'Direction': 'Type', 'Value': 'Bandwidth (B/s)'})[['Timestamp', 'Type', 'Bandwidth (B/s)']]
+            data = data.assign(Timestamp=pd.to_datetime(data['Timestamp']).dt.tz_localize(None))
+            frames.append((fingerprint[:30], data, RelayStats.calculate_statistics(data)))
+        output = os.path.join(tempfile.mkdtemp(), 'bench.xlsx')
+        def run():
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                for name, data, stats in frames:
+                    RelayStats.save_statistics_to_excel(stats, data, writer, name)
+        return run, sum(len(data) for _, data, _ in frames)
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+def measure_stage(stage, relays, seed, repeat, results):
+    # Runs in a fresh process so one stage's memory does not inflate the next one's peak
+    try:
+        results.put(_measure_stage(stage, relays, seed, repeat))
+    except ImportError as e:
+        results.put({'skipped': f"missing dependency: {e.name}"})
+    except Exception as e:
+        # Report instead of dying, or the parent would wait forever for this stage's result
+        results.put({'error': f"{type(e).__name__}: {e}"})
+
+def _measure_stage(stage, relays, seed, repeat):
+    run, rows = prepare_stage(stage, relays, seed)
+    best = None
+    for _ in range(repeat):
+        with RssSampler() as sampler:
+            started = time.perf_counter()
+            run()
+            wall = time.perf_counter() - started
+        sample = {
+            'wall_s': wall,
+            'peak_rss_mb': (sampler.peak - sampler.start) / 2 ** 20,
+            'rows': rows,
+            'rows_per_s': rows / wall if wall > 0 else None,
+        }
+        if best is None or sample['wall_s'] < best['wall_s']:
+            best = sample
+    return best
+
+def run_benchmarks(stages, sizes, seed=0, repeat=3):
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for relays in sizes:
+        for stage in stages:
+            queue = context.Queue()
+            process = context.Process(target=measure_stage, args=(stage, relays, seed, repeat, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            key = f"{stage}@{relays}"
+            results[key] = result
+            print(format_result(key, result))
+    return results
+
+def measure_startup(script, arguments, expected_status=0, repeat=5):
+    # Best-of-N wall time and peak RSS of a fresh interpreter running the entry point;
+    # any other exit status than expected_status means it failed to load
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryFile() as stderr:
+            started = time.perf_counter()
+            process = subprocess.Popen([sys.executable, os.path.join(REPO, script)] + arguments,
+                                       stdout=subprocess.DEVNULL, stderr=stderr, cwd=os.path.dirname(os.path.join(REPO, script)))
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)  # Reaped by wait4
+            wall = time.perf_counter() - started
+            if process.returncode != expected_status:
+                stderr.seek(0)
+                lines = stderr.read().decode(errors='replace').strip().splitlines()
+                return {'error': f"exit status {process.returncode}: {lines[-1] if lines else 'no output'}"}
+        sample = {'wall_s': wall, 'peak_rss_mb': usage.ru_maxrss / 1024,
+                  'rows': None, 'rows_per_s': None}
+        if best is None or sample['wall_s'] < best['wall_s']:
+            best = sample
+    return best
+
+def run_startup_benchmarks(repeat=5):
+    results = {}
+    for script, arguments, expected_status in ENTRY_POINTS:
+        key = f"startup:{os.path.basename(script)}"
+        results[key] = measure_startup(script, arguments, expected_status, repeat)
+        print(format_result(key, results[key]))
+    return results
+
+def format_result(key, result):
+    if 'skipped' in result:
+        return f"{key:<32} skipped ({result['skipped']})"
+    if 'error' in result:
+        return f"{key:<32} ERROR ({result['error']})"
+    line = f"{key:<32} {result['wall_s']:>9.3f}s {result['peak_rss_mb']:>9.1f} MB"
+    if result['rows_per_s']:
+        line += f" {result['rows_per_s']:>14,.0f} rows/s"
+    return line
+
+def compare_to_baseline(results, baseline, threshold):
+    """Return a list of regression messages for results slower or larger than baseline by more than threshold."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if not previous or not {'skipped', 'error'}.isdisjoint(list(result) + list(previous)):
+            continue
+        for metric in ('wall_s', 'peak_rss_mb'):
+            # Ignore tiny absolute values, where noise dominates the ratio
+            floor = 0.01 if metric == 'wall_s' else 1.0
+            old, new = previous[metric], result[metric]
+            if new > floor and new > max(old, floor) * (1 + threshold):
+                regressions.append(f"{key} {metric}: {old:.3f} -> {new:.3f} (+{(new / max(old, floor) - 1) * 100:.0f}%)")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the extract, stats, CDF, Excel and streaming stages on synthetic relays.')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES, help='Synthetic relay counts.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the fastest is reported.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic relays.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Stored baseline results to compare against.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown or memory growth (0.2 = 20%%).')
+    parser.add_argument('--output', help='Also write the results as JSON to this file.')
+    parser.add_argument('--startup', action='store_true',
+                        help='Time interpreter startup of each entry point (--help) instead of the stages.')
+    args = parser.parse_args()
+
+    if args.startup:
+        results = run_startup_benchmarks(max(args.repeat, 5))
+    else:
+        results = run_benchmarks(args.stages, args.sizes, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    errors = [key for key, result in results.items() if 'error' in result]
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        # A failed stage keeps its previous baseline entry
+        baseline.update({key: result for key, result in results.items() if key not in errors})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    if errors:
+        print(f"\n{len(errors)} stage(s) failed: {', '.join(errors)}")
+        sys.exit(1)
@@ -0,0 +1,129 @@
+# bootstrap.py
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from progress import Progress, add_logging_arguments, configure_logging
+
+log = logging.getLogger(__name__)
+
+STATISTICS = ("Mean Bandwidth", "Standard Deviation", "Coefficient of Variation")
+
+def padded_samples(fingerprints, values):
+    """Relays sorted by sample count, their counts, and a relays × max-count array of samples padded with NaN."""
+    import numpy as np
+    relays, codes, counts = np.unique(np.asarray(fingerprints, dtype=str), return_inverse=True, return_counts=True)
+    order = np.argsort(codes, kind='stable')
+    codes, values = codes[order], np.asarray(values, dtype=float)[order]
+    positions = np.arange(len(codes)) - np.concatenate([[0], np.cumsum(counts)[:-1]])[codes]
+    padded = np.full((len(relays), counts.max() if len(counts) else 0), np.nan)
+    padded[codes, positions] = values
+    by_count = np.argsort(counts, kind='stable')
+    return relays[by_count], counts[by_count], padded[by_count]
+
+def plan_chunks(counts, resamples, max_cells):
+    # Consecutive relays of similar size, each chunk drawing at most max_cells indices.
+    # Depends only on the data, so results do not change with the number of workers.
+    chunks = []
+    begin = 0
+    while begin < len(counts):
+        end = begin + 1
+        while end < len(counts) and (end + 1 - begin) * resamples * counts[end] <= max_cells:
+            end += 1
+        chunks.append((begin, end))
+        begin = end
+    return chunks
+
+def bootstrap_chunk(samples, counts, resamples, alpha, seed):
+    """Percentile intervals for mean, std and CoV of every relay in one chunk.
+
+    One index matrix of shape relays × resamples × samples is drawn per chunk;
+    positions past a relay's own count are masked out, so relays of different
+    sizes share a single vectorized resampling step. Returns the
+    relays × (3 statistics) × (low, high) intervals.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    width = counts.max()
+    samples = samples[:, :width]
+    center = np.nanmean(samples, axis=1)
+    centered = np.nan_to_num(samples - center[:, None])  # Centering keeps the sums of squares well conditioned
+    index = (rng.random((len(counts), resamples, width)) * counts[:, None, None]).astype(np.int64)
+    draws = np.take_along_axis(centered[:, None, :], index, axis=2)
+    draws *= np.arange(width) < counts[:, None, None]
+    n = counts[:, None].astype(float)
+    total = draws.sum(axis=2)
+    total_sq = np.square(draws).sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = center[:, None] + total / n
+        std = np.sqrt(np.maximum(total_sq - total ** 2 / n, 0) / (n - 1))
+        cov = np.where(mean != 0, std / mean, np.nan)
+    stacked = np.stack([mean, std, cov], axis=1)  # relays × statistics × resamples
+    return np.nanquantile(stacked, [alpha / 2, 1 - alpha / 2], axis=2).transpose(1, 2, 0)
+
+def bootstrap_statistics(fingerprints, values, resamples=1000, confidence=0.95, seed=0, workers=1,
+                         max_cells=2 ** 24):
+    """Per-relay mean, std and CoV with bootstrap percentile confidence intervals.
+
+    Samples are pooled across directions, as in calculate_statistics. Relays
+    are resampled in chunks of similar sample counts; every chunk gets its own
+    child of one SeedSequence, so a given seed reproduces the same intervals
+    with any number of worker processes. Relays with fewer than two samples get
+    no interval.
+    """
+    import numpy as np
+    import pandas as pd
+    relays, counts, samples = padded_samples(fingerprints, values)
+    chunks = plan_chunks(counts, resamples, max_cells)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    alpha = 1 - confidence
+    intervals = np.full((len(relays), len(STATISTICS), 2), np.nan)
+
+    progress = Progress(len(relays), label='relays bootstrapped')
+    jobs = [(samples[begin:end], counts[begin:end], resamples, alpha, chunk_seed)
+            for (begin, end), chunk_seed in zip(chunks, seeds)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(bootstrap_chunk, *zip(*jobs)) if jobs else []
+            for (begin, end), result in zip(chunks, results):
+                intervals[begin:end] = result
+                progress.update(count=end - begin)
+    else:
+        for (begin, end), job in zip(chunks, jobs):
+            intervals[begin:end] = bootstrap_chunk(*job)
+            progress.update(count=end - begin)
+    progress.finish()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(samples, axis=1)
+        std = np.nanstd(samples, axis=1, ddof=1)
+    point = {"Mean Bandwidth": mean, "Standard Deviation": std,
+             "Coefficient of Variation": np.where(mean != 0, std / mean, np.nan)}
+    intervals[counts < 2] = np.nan
+    result = {"Fingerprint": relays, "Samples": counts}
+    for i, name in enumerate(STATISTICS):
+        result[name] = point[name]
+        result[f"{name} CI Low"] = intervals[:, i, 0]
+        result[f"{name} CI High"] = intervals[:, i, 1]
+    return pd.DataFrame(result).sort_values("Fingerprint", ignore_index=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bootstrap confidence intervals for per-relay mean, std and CoV.')
+    parser.add_argument('input_csv', nargs='?', default='relay_bandwidth_data.csv', help='Bandwidth data CSV.')
+    parser.add_argument('--output', default='relay_bandwidth_stats_ci.csv', help='Output CSV.')
+    parser.add_argument('--resamples', type=int, default=1000, help='Bootstrap resamples per relay.')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the intervals.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same intervals.')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (1 runs in this process).')
+    parser.add_argument('--max-cells', type=int, default=2 ** 24,
+                        help='Resampled values drawn per chunk; bounds memory per worker (8 bytes each).')
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    import pandas as pd
+    df = pd.read_csv(args.input_csv, usecols=['Fingerprint', 'Value']).dropna(subset=['Value'])
+    stats = bootstrap_statistics(df['Fingerprint'].to_numpy(), df['Value'].to_numpy(), args.resamples,
+                                 args.confidence, args.seed, args.workers, args.max_cells)
+    stats.to_csv(args.output, index=False)
+    log.info("Saved bootstrap intervals for %d relays to '%s'.", len(stats), args.output)
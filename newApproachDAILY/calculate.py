@@ -1,9 +1,21 @@
 # calculate.py
-import pandas as pd
-import numpy as np
 import argparse
+import logging
+import time
+from metrics import ROWS, STAGE_SECONDS, add_metrics_arguments, finish_metrics, start_metrics
+from progress import add_logging_arguments, configure_logging
+from profiling import PROFILER, add_profile_arguments, finish_profiling, start_profiling
+
+log = logging.getLogger(__name__)
 
 def calculate_statistics(df):
+    with STAGE_SECONDS.time(stage='stats'):
+        stats_df = _calculate_statistics(df)
+    ROWS.inc(len(df), stage='stats')
+    return stats_df
+
+def _calculate_statistics(df):
+    import pandas as pd
     results = []
     grouped = df.groupby('Fingerprint')
 
@@ -22,16 +34,70 @@ def calculate_statistics(df):
             }
             results.append(result)
         else:
-            print(f"No data available for relay {fingerprint}")
+            log.debug("No data available for relay %s", fingerprint)
 
     return pd.DataFrame(results)
 
+def calculate_statistics_from_batches(batches):
+    # Same statistics as calculate_statistics, computed from in-memory columnar
+    # batches. Per-relay count, mean and sum of squared deviations are merged
+    # across batches so a relay may span several of them.
+    import numpy as np
+    import pandas as pd
+    accumulators = {}
+    for batch in batches:
+        started = time.perf_counter()
+        fingerprints = np.asarray(batch['Fingerprint'])
+        values = np.asarray(batch['Value'], dtype=float)
+        for fingerprint in pd.unique(fingerprints):
+            group = values[fingerprints == fingerprint]
+            n_b = len(group)
+            if n_b == 0:
+                continue
+            mean_b = group.mean()
+            m2_b = ((group - mean_b) ** 2).sum()
+            if fingerprint in accumulators:
+                n_a, mean_a, m2_a = accumulators[fingerprint]
+                n = n_a + n_b
+                delta = mean_b - mean_a
+                accumulators[fingerprint] = (n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n)
+            else:
+                accumulators[fingerprint] = (n_b, mean_b, m2_b)
+        # Timed per batch so the fetch work behind a generator of batches is not counted as stats time
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='stats')
+        ROWS.inc(len(values), stage='stats')
+
+    results = []
+    for fingerprint, (n, mean, m2) in sorted(accumulators.items()):
+        std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+        results.append({
+            "Fingerprint": fingerprint,
+            "Mean Bandwidth": mean,
+            "Standard Deviation": std,
+            "Coefficient of Variation": std / mean if mean != 0 else None
+        })
+
+    return pd.DataFrame(results, columns=["Fingerprint", "Mean Bandwidth", "Standard Deviation", "Coefficient of Variation"])
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Calculate statistics for relay bandwidth data.')
     parser.add_argument('input_csv', help='Input CSV file containing bandwidth data.')
+    add_metrics_arguments(parser)
+    add_logging_arguments(parser)
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    configure_logging(args)
+    start_metrics(args)
+    start_profiling(args)
+    import pandas as pd
 
-    df = pd.read_csv(args.input_csv)
-    stats_df = calculate_statistics(df)
-    stats_df.to_csv('relay_bandwidth_stats.csv', index=False)
-    print("Saved statistics data to 'relay_bandwidth_stats.csv'.")
+    with PROFILER.stage('read'):
+        df = pd.read_csv(args.input_csv)
+    with PROFILER.stage('stats'):
+        stats_df = calculate_statistics(df)
+    with STAGE_SECONDS.time(stage='write'), PROFILER.stage('write'):
+        stats_df.to_csv('relay_bandwidth_stats.csv', index=False)
+    ROWS.inc(len(stats_df), stage='write')
+    log.info("Saved statistics data to 'relay_bandwidth_stats.csv'.")
+    finish_metrics(args)
+    finish_profiling(args)
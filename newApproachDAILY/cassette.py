@@ -0,0 +1,179 @@
+# cassette.py
+import atexit
+import base64
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+def request_key(url):
+    # Match on path and query only, so a cassette recorded against one mirror replays against any base URL
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else '')
+
+class CassetteResponse:
+    # The subset of requests.Response the fetch scripts use, rebuilt from a cassette entry
+    def __init__(self, entry):
+        self.status_code = entry['status']
+        self.headers = CaseInsensitiveDict(entry['headers'])
+        self.url = entry['url']
+        if 'body_b64' in entry:
+            self.content = base64.b64decode(entry['body_b64'])
+        else:
+            self.content = entry['body'].encode('utf-8')
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+class CassetteWriter:
+    # One gzipped JSON-lines file shared by every recording session of a run
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'wt')
+        self.lock = threading.Lock()
+        self.file.write(json.dumps({'cassette': 1, 'recorded_at': time.time()}) + '\n')
+
+    def write(self, entry):
+        line = json.dumps(entry) + '\n'
+        with self.lock:
+            self.file.write(line)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+_writers = {}
+_cassettes = {}
+_registry_lock = threading.Lock()
+
+def cassette_writer(path):
+    """Return the writer for path, creating (and truncating) the file on first use in this process."""
+    with _registry_lock:
+        if path not in _writers:
+            _writers[path] = CassetteWriter(path)
+            atexit.register(_writers[path].close)
+        return _writers[path]
+
+class RecordingSession:
+    """Wraps a session and appends every request, response and latency to a gzipped cassette.
+
+    Transport errors are recorded too, so replay reproduces failures as well
+    as successful responses.
+    """
+
+    def __init__(self, session, path):
+        self.session = session
+        self.writer = cassette_writer(path)
+
+    def get(self, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.writer.write({'key': request_key(url), 'url': url, 'latency': time.perf_counter() - started,
+                               'error': type(e).__name__, 'message': str(e)})
+            raise
+        entry = {'key': request_key(url), 'url': url, 'latency': time.perf_counter() - started,
+                 'status': response.status_code, 'headers': dict(response.headers)}
+        try:
+            entry['body'] = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_b64'] = base64.b64encode(response.content).decode('ascii')
+        self.writer.write(entry)
+        return response
+
+    def mount(self, prefix, adapter):
+        self.session.mount(prefix, adapter)
+
+    def close(self):
+        self.writer.flush()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Cassette:
+    # Recorded entries grouped per request key, replayed in recorded order
+    def __init__(self, path):
+        self.entries = defaultdict(list)
+        self.cursors = defaultdict(int)
+        self.lock = threading.Lock()
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                entry = json.loads(line)
+                if 'key' in entry:
+                    self.entries[entry['key']].append(entry)
+
+    def next(self, key):
+        # A request repeated more often than it was recorded gets the last recorded answer again
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            index = min(self.cursors[key], len(entries) - 1)
+            self.cursors[key] += 1
+            return entries[index]
+
+def load_cassette(path):
+    # Shared per process so a retry session continues where the main pass left off
+    with _registry_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+class ReplaySession:
+    """Serves responses from a cassette instead of the network.
+
+    Each response is delayed by its recorded latency divided by speed (2.0 is
+    twice as fast, 0 disables the delays). Repeated requests for a URL get its
+    recorded responses in order, so retries see the same failures and
+    recoveries as the recorded run. Unrecorded URLs fail with a ConnectionError.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.cassette = load_cassette(path)
+        self.speed = speed
+
+    def get(self, url, **kwargs):
+        entry = self.cassette.next(request_key(url))
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"No recorded response for {url}")
+        if self.speed > 0:
+            time.sleep(entry['latency'] / self.speed)
+        if 'error' in entry:
+            error = getattr(requests.exceptions, entry['error'], requests.exceptions.ConnectionError)
+            raise error(entry['message'])
+        return CassetteResponse(entry)
+
+    def mount(self, prefix, adapter):
+        pass  # Nothing to retry: every answer comes from the cassette
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,160 @@
+# cluster.py
+import argparse
+import logging
+
+from progress import add_logging_arguments, configure_logging
+from series import add_matrix_arguments, matrix_from_args, window_from_args
+
+log = logging.getLogger(__name__)
+
+def normalize_series(values, min_coverage=0.5):
+    """Z-score each relay's series and fill its gaps with the mean (0).
+
+    Only the shape is kept, so a 1 MB/s and a 100 MB/s relay with the same
+    daily cycle look alike. Relays with data in fewer than min_coverage of the
+    columns, or with a flat series, are dropped. Returns the normalized rows
+    and the boolean mask of kept relays.
+    """
+    import numpy as np
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(values, axis=1, keepdims=True)
+        std = np.nanstd(values, axis=1, keepdims=True)
+    keep = (present.mean(axis=1) >= min_coverage) & (std[:, 0] > 0)
+    normalized = np.where(present, (values - mean) / np.where(std > 0, std, 1), 0)
+    return normalized[keep].astype(np.float32), keep
+
+def randomized_pca(x, components, oversample=10, power_iterations=2, seed=0):
+    """Project the rows of x onto their top principal components with a randomized SVD.
+
+    A random sketch of the column space, refined by a few power iterations,
+    replaces the full SVD; the cost is a handful of passes over x. Returns the
+    projected rows and the components (components × columns).
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    x = x - x.mean(axis=0)
+    rank = min(components + oversample, *x.shape)
+    sketch = x @ rng.standard_normal((x.shape[1], rank), dtype=np.float32)
+    for _ in range(power_iterations):
+        sketch, _ = np.linalg.qr(x @ (x.T @ sketch))
+    basis, _ = np.linalg.qr(sketch)
+    _, _, vt = np.linalg.svd(basis.T @ x, full_matrices=False)
+    vt = vt[:components]
+    return x @ vt.T, vt
+
+def fft_features(x, bands=16):
+    """Fourier power of every row summed into log-spaced frequency bands, scaled to unit length.
+
+    Bands keep a daily or weekly cycle in the same feature whatever the series
+    length, and magnitudes ignore phase, so relays with the same cycle in
+    different time zones land close together.
+    """
+    import numpy as np
+    power = np.abs(np.fft.rfft(x, axis=1))[:, 1:] ** 2
+    edges = np.unique(np.geomspace(1, power.shape[1] + 1, bands + 1).astype(int)) - 1
+    features = np.sqrt(np.add.reduceat(power, edges[:-1], axis=1))
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return (features / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+def squared_distances(x, centroids):
+    import numpy as np
+    return np.maximum((x * x).sum(axis=1)[:, None] - 2 * x @ centroids.T + (centroids * centroids).sum(axis=1), 0)
+
+def minibatch_kmeans(x, clusters, batch_size=1024, iterations=100, seed=0):
+    """Mini-batch k-means with k-means++ seeding; returns centroids, labels and distances.
+
+    Each iteration moves the centroids towards a random batch of rows with a
+    per-centroid learning rate of 1 / (rows assigned so far), so the cost per
+    iteration is independent of the number of relays.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(x))
+    centroids = np.empty((clusters, x.shape[1]), dtype=x.dtype)
+    centroids[0] = x[rng.integers(len(x))]
+    closest = squared_distances(x, centroids[:1])[:, 0]
+    for i in range(1, clusters):
+        probabilities = closest / closest.sum() if closest.sum() > 0 else None
+        centroids[i] = x[rng.choice(len(x), p=probabilities)]
+        closest = np.minimum(closest, squared_distances(x, centroids[i:i + 1])[:, 0])
+
+    seen = np.zeros(clusters)
+    for _ in range(iterations):
+        batch = x[rng.choice(len(x), size=min(batch_size, len(x)), replace=False)]
+        labels = squared_distances(batch, centroids).argmin(axis=1)
+        seen += np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centroids, dtype=float)
+        np.add.at(sums, labels, batch)
+        counts = np.bincount(labels, minlength=clusters)
+        moved = counts > 0
+        rate = (counts[moved] / seen[moved])[:, None]
+        centroids[moved] = (1 - rate) * centroids[moved] + rate * sums[moved] / counts[moved, None]
+
+    distances = squared_distances(x, centroids)
+    labels = distances.argmin(axis=1)
+    return centroids, labels, np.sqrt(distances[np.arange(len(x)), labels])
+
+def cluster_relays(values, clusters=8, method='pca', components=16, min_coverage=0.5, batch_size=1024,
+                   iterations=100, seed=0):
+    """Cluster relays by the shape of their bandwidth series.
+
+    values is the relays × time matrix from series.RelayMatrix.values().
+    Returns the kept-relay mask, labels, distances to the assigned centroid and
+    the centroid profiles: each cluster's mean normalized series.
+    """
+    import numpy as np
+    normalized, keep = normalize_series(values, min_coverage)
+    if not len(normalized):
+        return keep, np.empty(0, dtype=int), np.empty(0), np.empty((0, values.shape[1]))
+    if method == 'pca':
+        features, _ = randomized_pca(normalized, components, seed=seed)
+    else:
+        features = fft_features(normalized, components)
+    _, labels, distances = minibatch_kmeans(features, clusters, batch_size, iterations, seed)
+    n_clusters = labels.max() + 1
+    profiles = np.zeros((n_clusters, normalized.shape[1]))
+    np.add.at(profiles, labels, normalized)
+    profiles /= np.maximum(np.bincount(labels, minlength=n_clusters), 1)[:, None]
+    return keep, labels, distances, profiles
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Group relays by the shape of their bandwidth series.')
+    parser.add_argument('--resolution', type=int, default=12 * 3600,
+                        help='Grid resolution in seconds (default: the 12-hour interval of the 6_months block, '
+                             'the finest that covers windows more than a month back).')
+    parser.add_argument('--direction', choices=['Read', 'Write'], help='Use one direction only (default: both averaged).')
+    parser.add_argument('--clusters', type=int, default=8, help='Number of clusters.')
+    parser.add_argument('--method', choices=['pca', 'fft'], default='pca',
+                        help='Features: principal components (randomized SVD) or Fourier magnitudes.')
+    parser.add_argument('--components', type=int, default=16, help='Principal components or frequency bands to keep.')
+    parser.add_argument('--min-coverage', type=float, default=0.5,
+                        help='Skip relays with data in less than this fraction of the grid.')
+    parser.add_argument('--batch-size', type=int, default=1024, help='Relays per mini-batch.')
+    parser.add_argument('--iterations', type=int, default=100, help='Mini-batch iterations.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', default='relay_clusters.csv', help='Cluster assignment per relay.')
+    parser.add_argument('--centroids-output', default='relay_cluster_centroids.csv',
+                        help='Mean normalized series of each cluster, one row per cluster.')
+    add_matrix_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    import numpy as np
+    import pandas as pd
+    start, end = window_from_args(args)
+    grid = (int(start.timestamp()) // args.resolution * args.resolution, int(end.timestamp()))
+    matrix = matrix_from_args(args, (start, end), grid, args.resolution, args.direction)
+
+    keep, labels, distances, profiles = cluster_relays(matrix.values(), args.clusters, args.method, args.components,
+                                                       args.min_coverage, args.batch_size, args.iterations, args.seed)
+    assignments = pd.DataFrame({"Fingerprint": matrix.fingerprints[keep], "Cluster": labels, "Distance": distances})
+    assignments.to_csv(args.output, index=False)
+    times = pd.to_datetime(matrix.column_times(), unit='s', utc=True).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    centroids = pd.DataFrame(profiles, columns=times)
+    centroids.insert(0, "Relays", np.bincount(labels, minlength=len(profiles)))
+    centroids.insert(0, "Cluster", np.arange(len(profiles)))
+    centroids.to_csv(args.centroids_output, index=False)
+    log.info("Assigned %d relays to %d clusters (%d skipped for sparse or flat series); saved to '%s' and '%s'.",
+             len(assignments), len(profiles), int((~keep).sum()), args.output, args.centroids_output)
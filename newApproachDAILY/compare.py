@@ -0,0 +1,143 @@
+# compare.py
+import argparse
+import logging
+import os
+import sys
+
+from onionoo import BANDWIDTH_FIELDS, add_client_arguments, add_query_arguments, client_options_from_args, query_params_from_args
+from progress import Progress, add_logging_arguments, configure_logging
+
+# The bulk pager lives with the monthly collector
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'newApproach-MON'))
+
+log = logging.getLogger(__name__)
+
+# Blocks dataCollectionMONTH.py reads, in order of preference
+MONTHLY_BLOCKS = ('1_month', '3_months', '1_week')
+
+RESOLUTIONS = ('Daily', 'Monthly')
+
+def monthly_history(history):
+    # The single block the monthly collector would use, shaped like a full history
+    for name in MONTHLY_BLOCKS:
+        if history.get(name):
+            return {name: history[name]}
+    return {}
+
+def relay_values(relay, start, end):
+    """Daily and monthly bandwidth samples for one bandwidth document, both directions pooled.
+
+    Daily follows fetch_data.py and keeps every granularity block in the
+    window; monthly follows dataCollectionMONTH.py and keeps only the preferred
+    block. Both use the same window so the two are directly comparable.
+    """
+    import numpy as np
+    from fetch_data import extract_bandwidth_columns
+    daily, monthly = [], []
+    for key in ('write_history', 'read_history'):
+        history = relay.get(key)
+        if not history:
+            continue
+        daily.append(extract_bandwidth_columns(history, start, end)[1])
+        monthly.append(extract_bandwidth_columns(monthly_history(history), start, end)[1])
+    empty = np.empty(0)
+    return (np.concatenate(daily) if daily else empty), (np.concatenate(monthly) if monthly else empty)
+
+def summarize(values):
+    # Sample count, mean, sample standard deviation and CoV, as calculate.py computes them
+    import numpy as np
+    n = len(values)
+    if n == 0:
+        return 0, np.nan, np.nan, np.nan
+    mean = values.mean()
+    std = values.std(ddof=1) if n > 1 else np.nan
+    return n, mean, std, std / mean if mean != 0 else np.nan
+
+def compare_resolutions(relays, start, end, fingerprints=None):
+    """One row per relay with daily and monthly statistics side by side and their CoV difference.
+
+    relays are Onionoo bandwidth documents; fingerprints, if given, restricts
+    the comparison to those relays. A relay with data at only one resolution
+    keeps its row with the other side empty.
+    """
+    import pandas as pd
+    wanted = {fp.upper() for fp in fingerprints} if fingerprints is not None else None
+    rows = []
+    progress = Progress(len(relays), label='relays extracted')
+    for relay in relays:
+        fingerprint = relay.get('fingerprint')
+        if wanted is not None and (fingerprint or '').upper() not in wanted:
+            progress.update(count=1)
+            continue
+        daily, monthly = relay_values(relay, start, end)
+        progress.update(ok=len(daily) > 0 or len(monthly) > 0)
+        if len(daily) == 0 and len(monthly) == 0:
+            log.debug("No data in the window for relay %s", fingerprint)
+            continue
+        row = {"Fingerprint": fingerprint}
+        for resolution, values in zip(RESOLUTIONS, (daily, monthly)):
+            n, mean, std, cov = summarize(values)
+            row.update({f"{resolution} Samples": n, f"{resolution} Mean Bandwidth": mean,
+                        f"{resolution} Standard Deviation": std, f"{resolution} Coefficient of Variation": cov})
+        rows.append(row)
+    progress.finish()
+
+    columns = ["Fingerprint"] + [f"{resolution} {name}" for resolution in RESOLUTIONS
+                                 for name in ("Samples", "Mean Bandwidth", "Standard Deviation",
+                                              "Coefficient of Variation")]
+    table = pd.DataFrame(rows, columns=columns)
+    table["CoV Difference"] = table["Monthly Coefficient of Variation"] - table["Daily Coefficient of Variation"]
+    return table.sort_values("Fingerprint", ignore_index=True)
+
+def plot_cov_comparison(table, cov_x_max=2.0, output_file=None):
+    """CDFs of daily and monthly CoV on one set of axes."""
+    import numpy as np
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(10, 6))
+    for resolution in RESOLUTIONS:
+        values = np.sort(table[f"{resolution} Coefficient of Variation"].dropna().to_numpy())
+        if len(values) == 0:
+            continue
+        cdf = np.arange(1, len(values) + 1) / float(len(values))
+        plt.plot(values, cdf, marker='.', linestyle='none', label=f"{resolution} ({len(values)} relays)")
+    plt.xlabel("Coefficient of Variation (Unitless)")
+    plt.ylabel("CDF")
+    plt.title("CDF of Coefficient of Variation for Relay Bandwidths, Daily vs Monthly")
+    plt.grid(True, which='both', linestyle='--', linewidth=0.5)
+    plt.xlim([0, cov_x_max])
+    plt.legend()
+    if output_file:
+        plt.savefig(output_file)
+        plt.close()
+    else:
+        plt.show()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Collect bandwidth histories once and compare daily- and monthly-resolution statistics per relay.')
+    parser.add_argument('--fingerprints', help='Relay fingerprint CSV to restrict the comparison to.')
+    parser.add_argument('--months-ago', type=int, default=2, help='Window start, in 30-day months before now.')
+    parser.add_argument('--duration', type=int, default=1, help='Window length in 30-day months.')
+    parser.add_argument('--output', default='relay_bandwidth_comparison.csv', help='Joined per-relay comparison table.')
+    parser.add_argument('--cdf-output', default='COV_daily_vs_monthly.png', help='Combined CoV CDF plot.')
+    parser.add_argument('--cov-x-max', type=float, default=2.0, help='Upper x-axis limit of the CDF plot.')
+    add_query_arguments(parser, default_fields=BANDWIDTH_FIELDS, default_type='relay')
+    add_client_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    from dataCollectionMONTH import fetch_all_bandwidth_data
+    from fetch_data import fetch_window, read_fingerprints_csv
+
+    fingerprints = read_fingerprints_csv(args.fingerprints)[0] if args.fingerprints else None
+    start, end = fetch_window(args.months_ago, args.duration)
+    log.info("Fetching bandwidth documents for all relays...")
+    relays = fetch_all_bandwidth_data(query_params_from_args(args), client_options_from_args(args))
+
+    table = compare_resolutions(relays, start, end, fingerprints)
+    table.to_csv(args.output, index=False)
+    log.info("Saved the comparison for %d relays to '%s'.", len(table), args.output)
+    if not table.empty:
+        plot_cov_comparison(table, args.cov_x_max, args.cdf_output)
+        log.info("Saved the combined CDF to '%s'.", args.cdf_output)
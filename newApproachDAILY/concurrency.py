@@ -0,0 +1,121 @@
+# concurrency.py
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+
+# Responses that mean the server is overloaded or rate limiting us
+BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a Retry-After header (seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class AIMDController:
+    """Additive-increase/multiplicative-decrease limit on in-flight requests.
+
+    Every ``limit`` healthy completions (one round) raise the limit by
+    ``increase``. A 429, a 5xx, a transport error or a latency average above
+    ``latency_factor`` times the best average seen so far multiplies the limit
+    by ``decrease``, at most once per round so a burst of failures from the
+    same overload does not collapse it to the minimum. A Retry-After header
+    pauses all new requests until it has elapsed.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, increase=1, decrease=0.5, latency_factor=2.0,
+                 latency_smoothing=0.2):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_smoothing = latency_smoothing
+        self.in_flight = 0
+        self.latency_avg = None
+        self.latency_floor = None
+        self.healthy_in_round = 0
+        self.since_decrease = float('inf')
+        self.resume_at = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                wait = self.resume_at - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self.condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, latency, status=None, error=False, retry_after=None):
+        with self.condition:
+            self.in_flight -= 1
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+            congested = error or status in BACKOFF_STATUSES
+            if not congested:
+                if self.latency_avg is None:
+                    self.latency_avg = latency
+                else:
+                    self.latency_avg += self.latency_smoothing * (latency - self.latency_avg)
+                if self.latency_floor is None or self.latency_avg < self.latency_floor:
+                    self.latency_floor = self.latency_avg
+                else:
+                    # Let the floor drift up slowly so a permanent shift in server latency is not punished forever
+                    self.latency_floor += 0.01 * (self.latency_avg - self.latency_floor)
+                congested = self.latency_avg > self.latency_floor * self.latency_factor
+
+            self.since_decrease += 1
+            if congested:
+                if self.since_decrease > int(self.limit):
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.since_decrease = 0
+                    self.healthy_in_round = 0
+                    # Forget the inflated latency average so the new limit gets a fair trial
+                    self.latency_avg = None
+            else:
+                self.healthy_in_round += 1
+                if self.healthy_in_round >= int(self.limit):
+                    self.limit = min(self.maximum, self.limit + self.increase)
+                    self.healthy_in_round = 0
+            self.condition.notify_all()
+
+def controlled_get(session, url, controller, attempts=5, timeout=10, backoff_factor=1.0):
+    """GET url under the controller, retrying overload responses and transport errors.
+
+    Retries back off exponentially like urllib3's Retry(backoff_factor=...).
+    Returns the last response; raises the last transport error if every attempt failed.
+    """
+    for attempt in range(1, attempts + 1):
+        if attempt > 1:
+            time.sleep(backoff_factor * 2 ** (attempt - 2))
+        controller.acquire()
+        start = time.monotonic()
+        try:
+            response = session.get(url, timeout=timeout)
+        except requests.exceptions.RequestException:
+            controller.release(time.monotonic() - start, error=True)
+            if attempt == attempts:
+                raise
+            continue
+        controller.release(time.monotonic() - start, status=response.status_code,
+                           retry_after=response.headers.get('Retry-After'))
+        if response.status_code not in BACKOFF_STATUSES or attempt == attempts:
+            return response
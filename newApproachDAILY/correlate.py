@@ -0,0 +1,142 @@
+# correlate.py
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from progress import Progress, add_logging_arguments, configure_logging
+from series import add_matrix_arguments, matrix_from_args, window_from_args
+
+log = logging.getLogger(__name__)
+
+def prepare(values):
+    """Zero-filled, row-centred float32 values and their float32 presence mask."""
+    import numpy as np
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        centered = values - np.nanmean(values, axis=1, keepdims=True)
+    # Scale rows to unit RMS so float32 products stay well within range
+    scale = np.sqrt(np.nanmean(centered ** 2, axis=1, keepdims=True))
+    scale[~(scale > 0)] = 1.0
+    return np.where(present, centered / scale, 0).astype(np.float32), present.astype(np.float32)
+
+def block_correlation(x, mx, y, my):
+    """Pearson correlation between every row of x and every row of y over their shared samples.
+
+    Each pair only uses the time steps where both relays have data. The six
+    pairwise sums come from six matrix products of the block, so NaN handling
+    costs no Python loop. Returns correlations and overlap counts; pairs with
+    no variance over the overlap are NaN.
+    """
+    import numpy as np
+    n = mx @ my.T
+    sx, sy = x @ my.T, mx @ y.T
+    sxx, syy = (x * x) @ my.T, mx @ (y * y).T
+    sxy = x @ y.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = sxy - sx * sy / n
+        variance = (sxx - sx * sx / n) * (syy - sy * sy / n)
+        corr = np.where(variance > 0, covariance / np.sqrt(np.maximum(variance, 0)), np.nan)
+    return np.clip(corr, -1, 1), n
+
+def correlate(values, block=1024, min_overlap=24, top_k=10, threshold=None, workers=4):
+    """Top-k partners per relay, or every pair above threshold, from an N×T matrix with NaN gaps.
+
+    Row blocks are compared against every column block in worker threads (the
+    matrix products release the GIL); only a block × block tile is ever held at
+    once, never the dense N×N matrix. Pairs sharing fewer than min_overlap
+    samples are ignored. Returns (partners, correlations, overlaps) arrays of
+    shape N×top_k, with -1 for missing partners, or with threshold a list of
+    (i, j, correlation, overlap) tuples with i < j.
+    """
+    import numpy as np
+    x, mask = prepare(values)
+    n_relays = len(x)
+    starts = range(0, n_relays, block)
+
+    def row_block(begin):
+        end = min(begin + block, n_relays)
+        best_corr = np.full((end - begin, 0), -np.inf, dtype=np.float32)
+        best_index = np.empty((end - begin, 0), dtype=np.int64)
+        best_overlap = np.empty((end - begin, 0), dtype=np.int64)
+        pairs = []
+        for other in starts:
+            other_end = min(other + block, n_relays)
+            corr, overlap = block_correlation(x[begin:end], mask[begin:end], x[other:other_end], mask[other:other_end])
+            corr = np.where(overlap >= min_overlap, corr, np.nan)
+            rows, cols = np.arange(begin, end)[:, None], np.arange(other, other_end)[None, :]
+            corr[rows == cols] = np.nan  # A relay is not its own partner
+            if threshold is not None:
+                i, j = np.nonzero((np.nan_to_num(corr, nan=-np.inf) >= threshold) & (rows < cols))
+                pairs.extend(zip((i + begin).tolist(), (j + other).tolist(), corr[i, j].tolist(),
+                                 overlap[i, j].astype(int).tolist()))
+                continue
+            # Merge this tile's candidates into the running top-k of each row
+            candidates = np.concatenate([best_corr, np.nan_to_num(corr, nan=-np.inf)], axis=1)
+            indices = np.concatenate([best_index, np.broadcast_to(cols, corr.shape)], axis=1)
+            overlaps = np.concatenate([best_overlap, overlap.astype(np.int64)], axis=1)
+            keep = np.argsort(-candidates, axis=1, kind='stable')[:, :top_k]
+            best_corr = np.take_along_axis(candidates, keep, axis=1)
+            best_index = np.take_along_axis(indices, keep, axis=1)
+            best_overlap = np.take_along_axis(overlaps, keep, axis=1)
+        return begin, end, best_corr, best_index, best_overlap, pairs
+
+    partners = np.full((n_relays, top_k), -1, dtype=np.int64)
+    correlations = np.full((n_relays, top_k), np.nan, dtype=np.float32)
+    overlaps = np.zeros((n_relays, top_k), dtype=np.int64)
+    pairs = []
+    progress = Progress(n_relays, label='relays correlated')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for begin, end, best_corr, best_index, best_overlap, block_pairs in executor.map(row_block, starts):
+            found = np.isfinite(best_corr)
+            width = best_corr.shape[1]
+            partners[begin:end, :width] = np.where(found, best_index, -1)
+            correlations[begin:end, :width] = np.where(found, best_corr, np.nan)
+            overlaps[begin:end, :width] = np.where(found, best_overlap, 0)
+            pairs.extend(block_pairs)
+            progress.update(count=end - begin)
+    progress.finish()
+    if threshold is not None:
+        return sorted(pairs, key=lambda pair: -pair[2])
+    return partners, correlations, overlaps
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Find relays whose bandwidth moves together.')
+    parser.add_argument('--resolution', type=int, default=4 * 3600,
+                        help='Grid resolution in seconds (default: the 4-hour interval of the 1_month block).')
+    parser.add_argument('--direction', choices=['Read', 'Write'], help='Use one direction only (default: both averaged).')
+    parser.add_argument('--top-k', type=int, default=10, help='Partners to keep per relay.')
+    parser.add_argument('--threshold', type=float,
+                        help='Instead of top-k, output every pair with at least this correlation.')
+    parser.add_argument('--min-overlap', type=int, default=24, help='Ignore pairs sharing fewer samples.')
+    parser.add_argument('--block', type=int, default=1024, help='Relays per tile; memory per tile grows with its square.')
+    parser.add_argument('--threads', type=int, default=4, help='Tiles computed concurrently.')
+    parser.add_argument('--output', default='relay_correlations.csv', help='Output CSV.')
+    add_matrix_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    import pandas as pd
+    start, end = window_from_args(args)
+    grid = (int(start.timestamp()) // args.resolution * args.resolution, int(end.timestamp()))
+    matrix = matrix_from_args(args, (start, end), grid, args.resolution, args.direction)
+
+    fingerprints = matrix.fingerprints
+    if args.threshold is not None:
+        pairs = correlate(matrix.values(), args.block, args.min_overlap, threshold=args.threshold, workers=args.threads)
+        result = pd.DataFrame([(fingerprints[i], fingerprints[j], corr, overlap) for i, j, corr, overlap in pairs],
+                              columns=["Fingerprint", "Partner", "Correlation", "Overlap"])
+    else:
+        partners, correlations, overlaps = correlate(matrix.values(), args.block, args.min_overlap, args.top_k,
+                                                     workers=args.threads)
+        relay, rank = (partners >= 0).nonzero()
+        result = pd.DataFrame({
+            "Fingerprint": fingerprints[relay],
+            "Rank": rank + 1,
+            "Partner": fingerprints[partners[relay, rank]],
+            "Correlation": correlations[relay, rank],
+            "Overlap": overlaps[relay, rank],
+        })
+    result.to_csv(args.output, index=False)
+    log.info("Saved %d correlated pairs for %d relays to '%s'.", len(result), len(fingerprints), args.output)
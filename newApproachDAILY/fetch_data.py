@@ -1,25 +1,59 @@
 # fetch_data.py
 import requests
 from datetime import datetime, timezone, timedelta
-import pandas as pd
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+import csv
+import logging
 import time
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from onionoo import (BANDWIDTH_FIELDS, add_client_arguments, add_query_arguments, build_query_url,
+                     client_options_from_args, query_params_from_args, wrap_session)
+from streaming import run_bounded_pipeline
+from http2_session import Http2Session
+from concurrency import AIMDController, controlled_get
+from retry_queue import DeferredRetryQueue
+from priority import PRIORITY_KEYS, order_fingerprints, record_fetch_history, until_deadline
+from metrics import (PARSE_SECONDS, REQUEST_SECONDS, REQUESTS, RESPONSE_BYTES, ROWS, STAGE_SECONDS,
+                     add_metrics_arguments, finish_metrics, start_metrics)
+from progress import Progress, add_logging_arguments, configure_logging
+from profiling import PROFILER, add_profile_arguments, finish_profiling, start_profiling
 
-def fetch_bandwidth_history(fingerprint, session):
-    url = f"https://onionoo.torproject.org/bandwidth?lookup={fingerprint}"
+log = logging.getLogger(__name__)
+
+def fetch_bandwidth_history(fingerprint, session, query_params=None, controller=None, retry_queue=None):
+    if query_params is None:
+        query_params = {'fields': BANDWIDTH_FIELDS}
+    url = build_query_url('bandwidth', lookup=fingerprint, **query_params)
+    started = time.perf_counter()
     try:
-        response = session.get(url, timeout=10)
+        try:
+            if controller is not None:
+                # With a deferred retry queue, retry once here like Retry(total=1) and leave the rest to the queue
+                response = controlled_get(session, url, controller, attempts=2 if retry_queue is not None else 5)
+            else:
+                response = session.get(url, timeout=10)
+        finally:
+            # Timeouts and connection errors are the slowest requests, so they are timed too
+            REQUEST_SECONDS.observe(time.perf_counter() - started, stage='fetch')
+        REQUESTS.inc(stage='fetch', status=response.status_code)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching {fingerprint}: {e}")
+        if getattr(e, 'response', None) is None:
+            REQUESTS.inc(stage='fetch', status=type(e).__name__)
+        if retry_queue is not None:
+            log.debug("Deferring %s after error: %s", fingerprint, e)
+            retry_queue.defer(fingerprint, e)
+        else:
+            log.warning("Error fetching %s: %s", fingerprint, e)
         return None
 
-    bandwidth_data = response.json()
+    RESPONSE_BYTES.inc(len(response.content), stage='fetch')
+    with PARSE_SECONDS.time(stage='fetch'):
+        bandwidth_data = response.json()
     if not bandwidth_data.get("relays"):
-        print(f"Warning: No relay data found for {fingerprint}")
+        log.debug("No relay data found for %s", fingerprint)
         return None
 
     relay_info = bandwidth_data["relays"][0]
@@ -46,63 +80,387 @@ def extract_daily_bandwidth_data(history, start_date, end_date, direction, finge
                 })
     return data_points
 
-def process_relay(fingerprint, cutoff_start, cutoff_end, session):
-    print(f"Starting processing for relay {fingerprint}...")
-    result = fetch_bandwidth_history(fingerprint, session)
+def extract_bandwidth_columns(history, start_date, end_date):
+    # Vectorized counterpart of extract_daily_bandwidth_data: returns epoch-second
+    # timestamps and scaled values as arrays instead of one dict per data point
+    import numpy as np
+    start_ts = start_date.timestamp()
+    end_ts = end_date.timestamp()
+    timestamps = []
+    values = []
+    for data in history.values():
+        interval_factor = data.get("factor", 1)
+        interval_start = datetime.strptime(data["first"], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+        raw = np.array(data["values"], dtype=float)  # None becomes NaN
+        block_timestamps = interval_start + np.arange(len(raw)) * data["interval"]
+        mask = ~np.isnan(raw) & (block_timestamps >= start_ts) & (block_timestamps < end_ts)
+        timestamps.append(block_timestamps[mask].astype(np.int64))
+        values.append(raw[mask] * interval_factor)
+    if not timestamps:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+    return np.concatenate(timestamps), np.concatenate(values)
+
+def process_relay_columns(fingerprint, cutoff_start, cutoff_end, session, query_params=None, controller=None,
+                          retry_queue=None):
+    result = fetch_bandwidth_history(fingerprint, session, query_params, controller, retry_queue)
+    return relay_columns(fingerprint, result, cutoff_start, cutoff_end)
+
+def relay_columns(fingerprint, result, cutoff_start, cutoff_end):
+    # Columnar batch for one relay: equal-length arrays keyed by column name
+    if result is None:
+        return None
+    with STAGE_SECONDS.time(stage='extract'):
+        batch = _relay_columns(fingerprint, result, cutoff_start, cutoff_end)
+    if batch is not None:
+        ROWS.inc(len(batch["Value"]), stage='extract')
+    return batch
+
+def _relay_columns(fingerprint, result, cutoff_start, cutoff_end):
+    import numpy as np
+    columns = {"Timestamp": [], "Direction": [], "Value": []}
+    for history, direction in zip(result, ("Write", "Read")):
+        if not history:
+            continue
+        timestamps, values = extract_bandwidth_columns(history, cutoff_start, cutoff_end)
+        columns["Timestamp"].append(timestamps)
+        columns["Direction"].append(np.full(len(values), direction, dtype=object))
+        columns["Value"].append(values)
+    if not columns["Value"]:
+        return None
+
+    batch = {name: np.concatenate(arrays) for name, arrays in columns.items()}
+    batch["Fingerprint"] = np.full(len(batch["Value"]), fingerprint, dtype=object)
+    return batch
+
+def batch_to_frame(batch):
+    # Materialize a columnar batch with the same layout as relay_bandwidth_data.csv.
+    # Relays share a handful of distinct timestamps, so only the unique ones are formatted.
+    import numpy as np
+    import pandas as pd
+    unique_timestamps, inverse = np.unique(batch["Timestamp"], return_inverse=True)
+    formatted = np.array([datetime.fromtimestamp(ts, timezone.utc).isoformat() for ts in unique_timestamps.tolist()],
+                         dtype=object)
+    return pd.DataFrame({
+        "Fingerprint": batch["Fingerprint"],
+        "Timestamp": formatted[inverse],
+        "Direction": batch["Direction"],
+        "Value": batch["Value"],
+    })
+
+class CsvBatchSink:
+    # Appends columnar batches to a CSV, buffering until flush_rows rows are pending
+    def __init__(self, path, flush_rows=100000):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.relays = 0
+        self.fingerprints = []
+        self.header = True
+        self.file = open(path, 'w', newline='')
+
+    def __call__(self, batch):
+        self.pending.append(batch)
+        self.pending_rows += len(batch["Value"])
+        self.relays += 1
+        self.fingerprints.append(batch["Fingerprint"][0])
+        if self.pending_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            import pandas as pd
+            with STAGE_SECONDS.time(stage='write'):
+                frame = pd.concat([batch_to_frame(batch) for batch in self.pending], ignore_index=True)
+                frame.to_csv(self.file, header=self.header, index=False)
+            ROWS.inc(len(frame), stage='write')
+            self.header = False
+            self.pending = []
+            self.pending_rows = 0
+            log.debug("Wrote %d relays to %s.", self.relays, self.path)
+
+    def close(self):
+        self.flush()
+        if self.header:
+            self.file.write("Fingerprint,Timestamp,Direction,Value\n")
+        self.file.close()
+
+def process_relay(fingerprint, cutoff_start, cutoff_end, session, query_params=None, controller=None, retry_queue=None):
+    log.debug("Starting processing for relay %s...", fingerprint)
+    result = fetch_bandwidth_history(fingerprint, session, query_params, controller, retry_queue)
     if result is None:
-        print(f"No bandwidth history found for {fingerprint}. Skipping.")
+        log.debug("No bandwidth history found for %s. Skipping.", fingerprint)
         return []
 
     write_history, read_history = result
-    write_data = extract_daily_bandwidth_data(write_history, cutoff_start, cutoff_end, "Write", fingerprint) if write_history else []
-    read_data = extract_daily_bandwidth_data(read_history, cutoff_start, cutoff_end, "Read", fingerprint) if read_history else []
-    combined_data = write_data + read_data
+    with STAGE_SECONDS.time(stage='extract'):
+        write_data = extract_daily_bandwidth_data(write_history, cutoff_start, cutoff_end, "Write", fingerprint) if write_history else []
+        read_data = extract_daily_bandwidth_data(read_history, cutoff_start, cutoff_end, "Read", fingerprint) if read_history else []
+        combined_data = write_data + read_data
+    ROWS.inc(len(combined_data), stage='extract')
 
-    print(f"Completed processing for relay {fingerprint}.")
+    log.debug("Completed processing for relay %s.", fingerprint)
     return combined_data
 
-def fetch_bandwidth_data_concurrent(fingerprints, months_ago=2, month_duration=1):
+def fetch_window(months_ago, month_duration):
     cutoff_start = datetime.now(timezone.utc) - timedelta(days=months_ago * 30)
     cutoff_end = cutoff_start + timedelta(days=month_duration * 30)
-    all_data = []
-    total_relays = len(fingerprints)
+    return cutoff_start, cutoff_end
+
+def create_session(controller=None, retry_queue=None, client_options=None):
+    # Configure retries for the session. With a concurrency controller, overload
+    # statuses are retried by controlled_get so the controller can see them. With a
+    # deferred retry queue, the main pass retries once and leaves the rest to the queue.
+    # client_options may name several Onionoo mirrors to balance requests across,
+    # or select the multiplexed HTTP/2 backend in place of requests.
+    if (client_options or {}).get('http2'):
+        # httpx only retries connection failures; overload statuses are left to the
+        # controller or the deferred retry queue
+        session = Http2Session(max_connections=client_options.get('http2_connections', 2),
+                               retries=1 if retry_queue is not None else 3)
+        return wrap_session(session, client_options)
 
-    # Configure retries for the session
     session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504], allowed_methods=["GET"])
-    adapter = HTTPAdapter(max_retries=retries)
+    status_forcelist = [] if controller is not None else [500, 502, 503, 504]
+    total = 1 if retry_queue is not None else 5
+    retries = Retry(total=total, backoff_factor=1, status_forcelist=status_forcelist, allowed_methods=["GET"])
+    pool_size = controller.maximum if controller is not None else 10
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount('https://', adapter)
+    session.mount('http://', adapter)  # Local mirrors and stand-ins are often plain HTTP
+    return wrap_session(session, client_options)
+
+def fetch_bandwidth_batches(fingerprints, months_ago=2, month_duration=1, max_workers=5, query_params=None,
+                            controller=None, retry_queue=None, client_options=None, window=None):
+    # Yield one columnar batch per relay as soon as it has been fetched and extracted.
+    # window=(cutoff_start, cutoff_end) overrides months_ago/month_duration.
+    cutoff_start, cutoff_end = window or fetch_window(months_ago, month_duration)
+    if controller is not None:
+        max_workers = controller.maximum
+
+    def run(fps, session, workers):
+        progress = Progress(len(fps))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(process_relay_columns, fp, cutoff_start, cutoff_end, session, query_params, controller,
+                                retry_queue): fp
+                for fp in fps
+            }
+            for future in as_completed(futures):
+                try:
+                    batch = future.result()
+                    progress.update(ok=batch is not None)
+                    if batch is not None:
+                        yield batch
+                except Exception as e:
+                    progress.update(ok=False)
+                    log.error("Error processing relay %s: %s", futures[future], e)
+        progress.finish()
+
+    session = create_session(controller, retry_queue, client_options)
+    try:
+        yield from run(fingerprints, session, max_workers)
+    finally:
+        session.close()
+    if retry_queue is not None:
+        # drain() takes a callback, so collect each retry round before yielding it
+        retried = []
+        with create_session(controller, client_options=client_options) as retry_session:
+            retry_queue.drain(lambda fps: retried.extend(run(fps, retry_session, retry_queue.workers)))
+        yield from retried
+
+def fetch_bandwidth_data_streaming(fingerprints, output_csv, months_ago=2, month_duration=1, fetch_workers=5,
+                                   extract_workers=2, queue_depth=32, flush_rows=100000, query_params=None,
+                                   controller=None, retry_queue=None, ordered=False, time_budget=None,
+                                   client_options=None):
+    # Fetchers feed a bounded queue, extractors turn responses into columnar batches
+    # and the CSV sink appends them; a slow sink back-pressures the fetchers.
+    # With ordered=True rows are written in the order of fingerprints, and with a
+    # time_budget (seconds) no new relays are started once it has run out.
+    cutoff_start, cutoff_end = fetch_window(months_ago, month_duration)
+    if controller is not None:
+        # Enough threads for the controller's ceiling; it decides how many are actually in flight
+        fetch_workers = controller.maximum
+    sink = CsvBatchSink(output_csv, flush_rows)
+
+    def run(fps, session, workers, total):
+        # fps may be a generator cut short by the time budget, so the caller gives its size
+        progress = Progress(total)
+
+        def fetch(fp):
+            result = fetch_bandwidth_history(fp, session, query_params, controller, retry_queue)
+            progress.update(ok=result is not None)
+            return result
+
+        run_bounded_pipeline(
+            fps,
+            fetch=fetch,
+            extract=lambda fp, result: relay_columns(fp, result, cutoff_start, cutoff_end),
+            sink=sink,
+            fetch_workers=workers,
+            extract_workers=extract_workers,
+            queue_depth=queue_depth,
+            ordered=ordered,
+        )
+        progress.finish()
+
+    started = time.monotonic()
+    try:
+        with create_session(controller, retry_queue, client_options) as session:
+            run(until_deadline(fingerprints, time_budget) if time_budget else fingerprints, session, fetch_workers,
+                len(fingerprints))
+        # A time-boxed run leaves its failures in the manifest rather than overrunning on retries
+        out_of_time = time_budget is not None and time.monotonic() - started >= time_budget
+        if retry_queue is not None and not out_of_time:
+            with create_session(controller, client_options=client_options) as retry_session:
+                retry_queue.drain(lambda fps: run(fps, retry_session, retry_queue.workers, len(fps)))
+    finally:
+        sink.close()
+    log.info("Saved bandwidth data for %d/%d relays to '%s'.", sink.relays, len(fingerprints), output_csv)
+    return sink.fingerprints
+
+def fetch_bandwidth_data_concurrent(fingerprints, months_ago=2, month_duration=1, query_params=None, controller=None,
+                                    retry_queue=None, client_options=None):
+    cutoff_start, cutoff_end = fetch_window(months_ago, month_duration)
+    all_data = []
+
+    def run(fps, session, max_workers):
+        progress = Progress(len(fps))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_relay, fp, cutoff_start, cutoff_end, session, query_params, controller,
+                                retry_queue): fp
+                for fp in fps
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                    progress.update(ok=bool(result))
+                    if result:
+                        all_data.extend(result)
+                except Exception as e:
+                    progress.update(ok=False)
+                    log.error("Error processing relay %s: %s", futures[future], e)
+        progress.finish()
 
     max_workers = 5  # Reduce the number of concurrent threads
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_relay, fp, cutoff_start, cutoff_end, session): fp
-            for fp in fingerprints
-        }
-        for i, future in enumerate(as_completed(futures), start=1):
-            try:
-                result = future.result()
-                if result:
-                    all_data.extend(result)
-                print(f"Processed {i}/{total_relays} relays.")
-            except Exception as e:
-                print(f"Error processing relay {futures[future]}: {e}")
-
-    session.close()
+    if controller is not None:
+        max_workers = controller.maximum
+    with create_session(controller, retry_queue, client_options) as session:
+        run(fingerprints, session, max_workers)
+    if retry_queue is not None:
+        # Second pass over transient failures at lower concurrency with longer backoff
+        with create_session(controller, client_options=client_options) as retry_session:
+            retry_queue.drain(lambda fps: run(fps, retry_session, retry_queue.workers))
     return all_data
 
+def read_fingerprints_csv(path, delta=False):
+    """Return (fingerprints, removed) from a fingerprint CSV, or from a delta CSV with delta=True.
+
+    Only the Fingerprint (and Change) columns are needed, so this uses the csv
+    module rather than importing pandas just to read them.
+    """
+    fingerprints, removed = [], []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            if not delta or row['Change'] == 'added':
+                fingerprints.append(row['Fingerprint'])
+            elif row['Change'] == 'removed':
+                removed.append(row['Fingerprint'])
+    return fingerprints, removed
+
+def apply_fingerprint_delta(existing_df, new_data, removed):
+    # Drop relays that left the network and append rows for newly discovered ones
+    import pandas as pd
+    kept = existing_df[~existing_df['Fingerprint'].isin(set(removed))]
+    return pd.concat([kept, pd.DataFrame(new_data, columns=existing_df.columns)], ignore_index=True)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Fetch bandwidth data for relays.')
-    parser.add_argument('input_csv', help='Input CSV file containing relay fingerprints.')
+    parser.add_argument('input_csv', help='Input CSV file containing relay fingerprints, or a delta CSV with --delta.')
+    parser.add_argument('--delta', action='store_true',
+                        help='Treat input_csv as a delta from query_fingerprints.py --incremental and fetch only added relays.')
+    parser.add_argument('--merge-into',
+                        help='Existing bandwidth data CSV to update with the delta instead of replacing it (needs --delta).')
+    parser.add_argument('--stream', action='store_true',
+                        help='Append rows to the output CSV as relays complete instead of collecting them all in memory.')
+    parser.add_argument('--queue-depth', type=int, default=32, help='Bound on queued responses and batches with --stream.')
+    parser.add_argument('--fetch-workers', type=int, default=5, help='Concurrent fetch threads with --stream.')
+    parser.add_argument('--extract-workers', type=int, default=2, help='Extraction threads with --stream.')
+    parser.add_argument('--priority', choices=PRIORITY_KEYS, default='csv',
+                        help='Order in which relays are fetched; with --stream rows are also written in this order.')
+    parser.add_argument('--time-budget', type=float,
+                        help='With --stream, stop starting new relays after this many seconds.')
+    parser.add_argument('--fetch-history', default='fetch_history.json',
+                        help='Last successful fetch time per relay, used by --priority last_fetched.')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Adjust the number of in-flight requests with an AIMD controller instead of a fixed pool.')
+    parser.add_argument('--max-concurrency', type=int, default=32, help='Upper bound on in-flight requests with --adaptive.')
+    parser.add_argument('--retry-rounds', type=int, default=3,
+                        help='Rounds of deferred retries for relays that failed in the main pass (0 disables deferral).')
+    parser.add_argument('--retry-backoff', type=float, default=30.0, help='Pause before the first retry round, doubled each round.')
+    parser.add_argument('--retry-workers', type=int, default=2, help='Concurrent fetches during retry rounds.')
+    parser.add_argument('--failure-manifest', default='failed_fingerprints.csv',
+                        help='CSV listing relays that still failed after all retry rounds.')
+    add_query_arguments(parser, default_fields=BANDWIDTH_FIELDS)
+    add_client_arguments(parser)
+    add_metrics_arguments(parser)
+    add_logging_arguments(parser)
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    if args.merge_into and not args.delta:
+        # A full fingerprint list would append a second copy of every relay's rows
+        parser.error('--merge-into requires --delta')
+    configure_logging(args)
+    start_metrics(args)
+    start_profiling(args)
 
-    fingerprints_df = pd.read_csv(args.input_csv)
-    fingerprints = fingerprints_df['Fingerprint'].tolist()
-
-    bandwidth_data = fetch_bandwidth_data_concurrent(fingerprints)
-    if bandwidth_data:
-        df = pd.DataFrame(bandwidth_data)
-        df.to_csv('relay_bandwidth_data.csv', index=False)
-        print("Saved bandwidth data to 'relay_bandwidth_data.csv'.")
+    fingerprints, removed = read_fingerprints_csv(args.input_csv, delta=args.delta)
+    query_params = query_params_from_args(args)
+    client_options = client_options_from_args(args)
+    fingerprints = order_fingerprints(fingerprints, args.priority, args.fetch_history, client_options)
+    controller = AIMDController(maximum=args.max_concurrency) if args.adaptive else None
+    retry_queue = None
+    if args.retry_rounds > 0:
+        retry_queue = DeferredRetryQueue(rounds=args.retry_rounds, backoff=args.retry_backoff, workers=args.retry_workers)
+    if args.merge_into:
+        with PROFILER.stage('fetch'):
+            bandwidth_data = fetch_bandwidth_data_concurrent(fingerprints, query_params=query_params, controller=controller,
+                                                             retry_queue=retry_queue, client_options=client_options)
+        # Existing rows keep the window they were fetched with; only the delta is refetched
+        record_fetch_history({row['Fingerprint'] for row in bandwidth_data}, args.fetch_history)
+        import pandas as pd
+        with STAGE_SECONDS.time(stage='write'), PROFILER.stage('write'):
+            df = apply_fingerprint_delta(pd.read_csv(args.merge_into), bandwidth_data, removed)
+            df.to_csv('relay_bandwidth_data.csv', index=False)
+        ROWS.inc(len(df), stage='write')
+        log.info("Merged %d added and %d removed relays into 'relay_bandwidth_data.csv'.", len(fingerprints), len(removed))
+    elif args.stream:
+        # Fetching, extraction and CSV writes overlap when streaming, so they are profiled as one stage
+        with PROFILER.stage('fetch'):
+            fetched = fetch_bandwidth_data_streaming(fingerprints, 'relay_bandwidth_data.csv',
+                                                     fetch_workers=args.fetch_workers,
+                                                     extract_workers=args.extract_workers, queue_depth=args.queue_depth,
+                                                     query_params=query_params, controller=controller,
+                                                     retry_queue=retry_queue, ordered=args.priority != 'csv',
+                                                     time_budget=args.time_budget, client_options=client_options)
+        record_fetch_history(fetched, args.fetch_history)
     else:
-        print("No bandwidth data collected.")
+        with PROFILER.stage('fetch'):
+            bandwidth_data = fetch_bandwidth_data_concurrent(fingerprints, query_params=query_params, controller=controller,
+                                                             retry_queue=retry_queue, client_options=client_options)
+        record_fetch_history({row['Fingerprint'] for row in bandwidth_data}, args.fetch_history)
+        if bandwidth_data:
+            import pandas as pd
+            with STAGE_SECONDS.time(stage='write'), PROFILER.stage('write'):
+                df = pd.DataFrame(bandwidth_data)
+                df.to_csv('relay_bandwidth_data.csv', index=False)
+            ROWS.inc(len(df), stage='write')
+            log.info("Saved bandwidth data to 'relay_bandwidth_data.csv'.")
+        else:
+            log.warning("No bandwidth data collected.")
+
+    if retry_queue is not None:
+        retry_queue.write_manifest(args.failure_manifest)
+    finish_metrics(args)
+    finish_profiling(args)
@@ -0,0 +1,71 @@
+# http2_session.py
+import requests
+
+class Http2Response:
+    # The subset of requests.Response the fetch scripts use, backed by an httpx response
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def text(self):
+        return self._response.text
+
+    @property
+    def content(self):
+        return self._response.content
+
+    def json(self):
+        return self._response.json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+class Http2Session:
+    """requests.Session-compatible client that multiplexes requests over a few HTTP/2 connections.
+
+    Many threads can call get() at once; httpx interleaves their requests as
+    streams on max_connections connections per host instead of opening one
+    HTTP/1.1 connection per in-flight lookup, which saves TLS handshakes and
+    avoids head-of-line stalls behind a slow response. gzip (and brotli, if
+    installed) is negotiated via Accept-Encoding. httpx errors are re-raised as
+    the matching requests exceptions so callers keep a single error path.
+
+    Requires the optional dependency: pip install 'httpx[http2]'
+    """
+
+    def __init__(self, max_connections=2, retries=3):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("The HTTP/2 backend needs httpx with HTTP/2 support: pip install 'httpx[http2]'") from e
+        self._httpx = httpx
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # Connections are reused across streams, so the pool only needs a few of them
+        transport = httpx.HTTPTransport(http2=True, retries=retries, limits=limits)
+        self.client = httpx.Client(http2=True, transport=transport, timeout=10.0, follow_redirects=True)
+
+    def get(self, url, timeout=10, headers=None, **kwargs):
+        httpx = self._httpx
+        try:
+            response = self.client.get(url, timeout=timeout, headers=headers)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+        return Http2Response(response)
+
+    def mount(self, prefix, adapter):
+        pass  # Retries and pooling are configured on the httpx transport
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,223 @@
+# metrics.py
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def snapshot(self):
+        # Copy under the lock so a live scrape never iterates a dict the fetch threads are growing
+        with self.lock:
+            return sorted(self.values.items())
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.snapshot():
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+    def to_dict(self):
+        return [{'labels': dict(key), 'value': value} for key, value in self.snapshot()]
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series = {}  # label key -> [bucket counts..., count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def total(self, **labels):
+        series = self.series.get(_label_key(labels))
+        return (series[-2], series[-1]) if series else (0, 0.0)
+
+    def snapshot(self):
+        with self.lock:
+            return sorted((key, list(series)) for key, series in self.series.items())
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self.snapshot():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-2]}")
+        return lines
+
+    def to_dict(self):
+        return [{
+            'labels': dict(key),
+            'count': series[-2],
+            'sum': series[-1],
+            'buckets': dict(zip([str(b) for b in self.buckets], series)),
+        } for key, series in self.snapshot()]
+
+class Registry:
+    """Named counters and histograms, dumped as Prometheus text or JSON.
+
+    Every metric takes a ``stage`` label (fetch, extract, stats, write) so one
+    run shows where its time went. Recording is a dict update under a lock, cheap
+    enough to do per request from the fetch threads.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help):
+        return self._register(Counter(name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, buckets))
+
+    def rows_per_second(self):
+        # Derived at dump time from the row counter and the stage timers
+        rates = {}
+        rows_total = self.metrics.get('relaydata_rows_total')
+        stage_seconds = self.metrics.get('relaydata_stage_seconds')
+        if rows_total is None or stage_seconds is None:
+            return rates
+        for key, rows in rows_total.snapshot():
+            _, seconds = stage_seconds.total(**dict(key))
+            if seconds > 0:
+                rates[key] = rows / seconds
+        return rates
+
+    def to_prometheus(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.exposition()
+        name = 'relaydata_rows_per_second'
+        lines += [f"# HELP {name} Rows processed per second of stage time.", f"# TYPE {name} gauge"]
+        for key, rate in sorted(self.rows_per_second().items()):
+            lines.append(f"{name}{_format_labels(key)} {rate:.1f}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        data = {name: metric.to_dict() for name, metric in self.metrics.items()}
+        data['relaydata_rows_per_second'] = [{'labels': dict(key), 'value': rate}
+                                             for key, rate in sorted(self.rows_per_second().items())]
+        return data
+
+    def write(self, path):
+        """Write the metrics to path, as JSON if it ends in .json and Prometheus text otherwise."""
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram('relaydata_request_seconds', 'Onionoo request latency, including retries.')
+REQUESTS = REGISTRY.counter('relaydata_requests_total', 'Onionoo requests by final HTTP status or error.')
+RESPONSE_BYTES = REGISTRY.counter('relaydata_response_bytes_total', 'Response body bytes received from Onionoo.')
+PARSE_SECONDS = REGISTRY.histogram('relaydata_parse_seconds', 'Time spent decoding JSON responses.')
+STAGE_SECONDS = REGISTRY.histogram('relaydata_stage_seconds', 'Time spent per call in extract, stats and write steps.')
+ROWS = REGISTRY.counter('relaydata_rows_total', 'Bandwidth rows produced or consumed by each stage.')
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/metrics.json':
+            body, content_type = json.dumps(self.registry.to_dict()).encode(), 'application/json'
+        elif self.path.rstrip('/') in ('', '/metrics'):
+            body, content_type = self.registry.to_prometheus().encode(), 'text/plain; version=0.0.4'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve_metrics(port, host='127.0.0.1', registry=REGISTRY):
+    """Serve /metrics (Prometheus text) and /metrics.json from a background thread; returns the server."""
+    handler = type('ConfiguredMetricsHandler', (MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_metrics_arguments(parser):
+    group = parser.add_argument_group('Metrics options')
+    group.add_argument('--metrics-output', metavar='FILE',
+                       help='Write per-stage metrics at the end of the run (.json for JSON, otherwise Prometheus text).')
+    group.add_argument('--metrics-port', type=int, help='Serve live metrics at http://127.0.0.1:PORT/metrics during the run.')
+    return group
+
+def start_metrics(args):
+    if args.metrics_port:
+        server = serve_metrics(args.metrics_port)
+        log.info("Serving metrics at http://127.0.0.1:%d/metrics", server.server_port)
+
+def finish_metrics(args):
+    if args.metrics_output:
+        REGISTRY.write(args.metrics_output)
+        log.info("Wrote metrics to '%s'.", args.metrics_output)
@@ -0,0 +1,207 @@
+# onionoo.py
+import logging
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+log = logging.getLogger(__name__)
+
+ONIONOO_URL = 'https://onionoo.torproject.org'
+
+# Everything the bandwidth fetchers actually read from a bandwidth document
+BANDWIDTH_FIELDS = ['fingerprint', 'write_history', 'read_history']
+
+def build_query_url(document, base_url=ONIONOO_URL, **params):
+    """Build an Onionoo URL for a document type such as 'summary' or 'bandwidth'.
+
+    Parameters set to None are omitted, lists are joined with commas and
+    booleans are written as 'true'/'false', e.g.
+    build_query_url('bandwidth', lookup=fp, fields=['fingerprint', 'read_history'])
+    """
+    query = {}
+    for key, value in params.items():
+        if value is None or value == []:
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        elif isinstance(value, (list, tuple)):
+            value = ','.join(str(v) for v in value)
+        query[key] = value
+    url = f"{base_url.rstrip('/')}/{document}"
+    return f"{url}?{urlencode(query, safe=',')}" if query else url
+
+def add_query_arguments(parser, default_fields=None, default_type=None, default_running=None):
+    """Add the server-side filter options shared by the fetch scripts to an argparse parser."""
+    group = parser.add_argument_group('Onionoo query options')
+    group.add_argument('--fields', default=','.join(default_fields) if default_fields else None,
+                       help='Comma-separated top-level fields to return; an empty string requests full documents.')
+    group.add_argument('--running', choices=['true', 'false'], default=default_running,
+                       help='Only return relays that are (or are not) currently running.')
+    group.add_argument('--type', dest='relay_type', choices=['relay', 'bridge'], default=default_type,
+                       help='Only return relays or only bridges.')
+    group.add_argument('--flag', help='Only return relays with this relay flag, e.g. Guard, Exit or Stable.')
+    return group
+
+def query_params_from_args(args):
+    """Collect the options added by add_query_arguments into keyword arguments for build_query_url."""
+    return {
+        'fields': args.fields.split(',') if args.fields else None,
+        'running': args.running,
+        'type': args.relay_type,
+        'flag': args.flag,
+    }
+
+class Mirror:
+    def __init__(self, base_url, max_in_flight):
+        self.base_url = base_url.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.latency_avg = 0.0
+
+class MirrorSession:
+    """Drop-in for requests.Session.get() that spreads Onionoo requests over several base URLs.
+
+    URLs are built against ONIONOO_URL as usual; only their path and query are
+    kept and sent to the least loaded healthy mirror. Each mirror has its own
+    in-flight limit, so one slow endpoint only ties up its own slots. A mirror
+    that fails failure_threshold times in a row is taken out of rotation for a
+    cooldown that doubles on every further failure; the first request after the
+    cooldown acts as its health probe. Failed requests fail over to another mirror.
+    """
+
+    def __init__(self, session, base_urls, max_in_flight=8, failure_threshold=3, cooldown=30.0):
+        self.session = session
+        self.mirrors = [Mirror(url, max_in_flight) for url in base_urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.condition = threading.Condition()
+
+    def _pick(self, exclude):
+        now = time.monotonic()
+        candidates = [m for m in self.mirrors if m not in exclude and m.in_flight < m.max_in_flight]
+        healthy = [m for m in candidates if m.down_until <= now]
+        if healthy:
+            return min(healthy, key=lambda m: (m.in_flight / m.max_in_flight, m.latency_avg))
+        if candidates and not any(m.down_until <= now for m in self.mirrors if m not in exclude):
+            # Everything is marked down: try whichever comes back first rather than stalling
+            return min(candidates, key=lambda m: m.down_until)
+        return None
+
+    def acquire(self, exclude=()):
+        with self.condition:
+            while True:
+                mirror = self._pick(exclude)
+                if mirror is not None:
+                    mirror.in_flight += 1
+                    return mirror
+                self.condition.wait(timeout=1.0)
+
+    def release(self, mirror, latency, ok):
+        with self.condition:
+            mirror.in_flight -= 1
+            if ok:
+                mirror.consecutive_failures = 0
+                mirror.down_until = 0.0
+                mirror.latency_avg = latency if not mirror.latency_avg else 0.8 * mirror.latency_avg + 0.2 * latency
+            else:
+                mirror.consecutive_failures += 1
+                if mirror.consecutive_failures >= self.failure_threshold:
+                    backoff = self.cooldown * 2 ** (mirror.consecutive_failures - self.failure_threshold)
+                    mirror.down_until = time.monotonic() + backoff
+                    log.warning("Mirror %s marked down for %.0fs", mirror.base_url, backoff)
+            self.condition.notify_all()
+
+    def get(self, url, **kwargs):
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+        tried = []
+        while True:
+            mirror = self.acquire(tried)
+            tried.append(mirror)
+            start = time.monotonic()
+            try:
+                response = self.session.get(mirror.base_url + path, **kwargs)
+            except requests.exceptions.RequestException:
+                self.release(mirror, time.monotonic() - start, ok=False)
+                if len(tried) == len(self.mirrors):
+                    raise
+                continue
+            ok = response.status_code < 500 and response.status_code != 429
+            self.release(mirror, time.monotonic() - start, ok)
+            if ok or len(tried) == len(self.mirrors):
+                return response
+
+    def mount(self, prefix, adapter):
+        self.session.mount(prefix, adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def add_client_arguments(parser):
+    """Add the options that choose which Onionoo endpoints to talk to."""
+    group = parser.add_argument_group('Onionoo client options')
+    group.add_argument('--base-url', action='append', dest='base_urls', metavar='URL',
+                       help=f'Onionoo base URL; repeat to load-balance across mirrors (default {ONIONOO_URL}).')
+    group.add_argument('--mirror-concurrency', type=int, default=8, help='In-flight request limit per mirror.')
+    group.add_argument('--http2', action='store_true',
+                       help="Multiplex requests over a few HTTP/2 connections (needs 'httpx[http2]').")
+    group.add_argument('--http2-connections', type=int, default=2, help='HTTP/2 connections per host with --http2.')
+    cassette = group.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='CASSETTE',
+                          help='Record every Onionoo response and its latency to a gzipped cassette file.')
+    cassette.add_argument('--replay', metavar='CASSETTE',
+                          help='Serve Onionoo responses from a cassette recorded with --record instead of the network.')
+    group.add_argument('--replay-speed', type=float, default=1.0,
+                       help='Replay latencies divided by this factor (2 = twice as fast, 0 = no delays).')
+    return group
+
+def client_options_from_args(args):
+    """Collect the options added by add_client_arguments for wrap_session."""
+    return {
+        'base_urls': args.base_urls,
+        'max_in_flight': args.mirror_concurrency,
+        'http2': args.http2,
+        'http2_connections': args.http2_connections,
+        'record': args.record,
+        'replay': args.replay,
+        'replay_speed': args.replay_speed,
+    }
+
+def wrap_session(session, client_options=None):
+    """Return session unchanged for the default endpoint, or wrapped in a MirrorSession for other base URLs.
+
+    With 'replay' in client_options the session is replaced by one serving a
+    cassette; with 'record' every response passing through it is recorded.
+    """
+    client_options = client_options or {}
+    if client_options.get('replay'):
+        from cassette import ReplaySession
+        session.close()
+        session = ReplaySession(client_options['replay'], speed=client_options.get('replay_speed', 1.0))
+    elif client_options.get('record'):
+        from cassette import RecordingSession
+        session = RecordingSession(session, client_options['record'])
+    base_urls = client_options.get('base_urls')
+    if not base_urls or list(base_urls) == [ONIONOO_URL]:
+        return session
+    return MirrorSession(session, base_urls, max_in_flight=client_options.get('max_in_flight', 8))
+
+def open_session(client_options=None):
+    """Create the HTTP session described by client_options: requests or HTTP/2, optionally over mirrors."""
+    client_options = client_options or {}
+    if client_options.get('http2'):
+        from http2_session import Http2Session
+        session = Http2Session(max_connections=client_options.get('http2_connections', 2))
+    else:
+        session = requests.Session()
+    return wrap_session(session, client_options)
@@ -0,0 +1,171 @@
+# onionoo_standin.py
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import synthetic
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Return 0 if a request may proceed, otherwise the seconds until a token is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+class StandinConfig:
+    """What the stand-in serves and how badly it behaves.
+
+    latency/jitter are seconds added to every response, error_rate is the
+    fraction of requests answered with 503, and rate_limit (requests per second,
+    with burst) answers excess requests with 429 and a Retry-After header.
+    """
+
+    def __init__(self, relays=1000, seed=0, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None, burst=10):
+        self.relays = relays
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.last_modified = format_datetime(self.now, usegmt=True)
+        self.index = {synthetic.relay_fingerprint(i, seed): i for i in range(relays)}
+        self.fingerprints = list(self.index)
+
+class StandinHandler(BaseHTTPRequestHandler):
+    config = None  # Set on a subclass by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Last-Modified', self.config.last_modified)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        config = self.config
+        if config.bucket is not None:
+            wait = config.bucket.take()
+            if wait:
+                self.send_json(429, {'error': 'rate limited'}, {'Retry-After': str(max(1, round(wait)))})
+                return
+        delay = config.latency + random.uniform(0, config.jitter)
+        if delay:
+            time.sleep(delay)
+        if config.error_rate and random.random() < config.error_rate:
+            self.send_json(503, {'error': 'injected failure'})
+            return
+
+        parts = urlsplit(self.path)
+        document = parts.path.strip('/')
+        if document not in ('summary', 'bandwidth', 'details'):
+            self.send_json(404, {'error': f'unknown document {document}'})
+            return
+
+        since = self.headers.get('If-Modified-Since')
+        if since:
+            try:
+                if parsedate_to_datetime(since) >= config.now:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+            except (TypeError, ValueError):
+                pass
+
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.send_json(200, self.build_document(document, params))
+
+    def build_document(self, document, params):
+        config = self.config
+        if 'lookup' in params:
+            index = config.index.get(params['lookup'].upper())
+            indices = [index] if index is not None else []
+        else:
+            indices = range(config.relays)
+        if params.get('type') == 'bridge':
+            indices = []
+        if 'running' in params:
+            wanted = params['running'] == 'true'
+            indices = [i for i in indices if synthetic.relay_profile(i, config.seed)['running'] == wanted]
+
+        offset = int(params.get('offset', 0))
+        limit = int(params['limit']) if 'limit' in params else None
+        indices = list(indices)[offset:offset + limit if limit is not None else None]
+
+        if document == 'summary':
+            relays = [synthetic.summary_entry(i, config.seed) for i in indices]
+        elif document == 'details':
+            relays = [synthetic.details_entry(i, config.seed) for i in indices]
+        else:
+            relays = [synthetic.bandwidth_document(i, config.seed, config.now) for i in indices]
+        if 'fields' in params and document != 'summary':
+            fields = set(params['fields'].split(','))
+            relays = [{k: v for k, v in relay.items() if k in fields} for relay in relays]
+
+        return {
+            'version': '8.0',
+            'relays_published': config.now.strftime('%Y-%m-%d %H:%M:%S'),
+            'relays': relays,
+            'bridges_published': config.now.strftime('%Y-%m-%d %H:%M:%S'),
+            'bridges': [],
+        }
+
+def make_server(config, host='127.0.0.1', port=0):
+    handler = type('ConfiguredStandinHandler', (StandinHandler,), {'config': config})
+    return ThreadingHTTPServer((host, port), handler)
+
+def start_standin(config, host='127.0.0.1', port=0):
+    """Serve config in a background thread; returns (server, base_url). Call server.shutdown() when done."""
+    server = make_server(config, host, port)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve synthetic Onionoo summary, details and bandwidth documents locally.')
+    parser.add_argument('--size', choices=sorted(synthetic.SIZES), default='1k', help='Preset number of relays.')
+    parser.add_argument('--relays', type=int, help='Number of relays (overrides --size).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic relays.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency of up to this many seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503.')
+    parser.add_argument('--rate-limit', type=float, help='Requests per second before answering 429.')
+    parser.add_argument('--burst', type=int, default=10, help='Burst size for --rate-limit.')
+    args = parser.parse_args()
+
+    config = StandinConfig(relays=args.relays or synthetic.SIZES[args.size], seed=args.seed, latency=args.latency,
+                           jitter=args.jitter, error_rate=args.error_rate, rate_limit=args.rate_limit, burst=args.burst)
+    server = make_server(config, args.host, args.port)
+    print(f"Serving {config.relays} synthetic relays at http://{args.host}:{server.server_port} "
+          f"(use --base-url with the fetch scripts)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
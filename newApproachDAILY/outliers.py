@@ -0,0 +1,129 @@
+# outliers.py
+import argparse
+import logging
+
+from progress import add_logging_arguments, configure_logging
+from series import add_matrix_arguments, columns_from_args, window_from_args
+
+log = logging.getLogger(__name__)
+
+def row_quantiles(values, quantiles):
+    """Per-row quantiles of an N×T array ignoring NaN, with np.percentile's linear interpolation.
+
+    One sort of the whole array replaces a percentile call per relay: NaNs sort
+    to the end of each row, so each row's k valid values are its first k
+    columns. Returns a len(quantiles) × N array, NaN for rows with no values.
+    """
+    import numpy as np
+    ordered = np.sort(values, axis=1)
+    valid = np.count_nonzero(~np.isnan(values), axis=1)
+    last = np.maximum(valid - 1, 0)
+    results = []
+    for q in quantiles:
+        position = last * q
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, last)
+        low = np.take_along_axis(ordered, below[:, None], axis=1)[:, 0]
+        high = np.take_along_axis(ordered, above[:, None], axis=1)[:, 0]
+        results.append(np.where(valid > 0, low + (high - low) * (position - below), np.nan))
+    return np.array(results)
+
+def iqr_outliers(values, whisker=1.5):
+    """Tukey outlier mask for every relay at once.
+
+    values is relays × samples with NaN for gaps. A sample is an outlier when it
+    lies more than whisker IQRs below the first or above the third quartile of
+    its own relay, as in RelayStats.calculate_statistics. Returns the mask and
+    the per-relay q25, q75, lower and upper bounds.
+    """
+    import numpy as np
+    q25, q75 = row_quantiles(values, (0.25, 0.75))
+    spread = q75 - q25
+    lower, upper = q25 - whisker * spread, q75 + whisker * spread
+    with np.errstate(invalid='ignore'):
+        mask = (values < lower[:, None]) | (values > upper[:, None])
+    return mask, (q25, q75, lower, upper)
+
+def direction_values(matrices):
+    # Read and Write side by side, so quartiles of the pooled row match RelayStats' 'Total'
+    import numpy as np
+    values = np.hstack([matrix.values() for matrix in matrices.values()])
+    times = np.concatenate([matrix.column_times() for matrix in matrices.values()])
+    directions = np.concatenate([np.full(matrix.shape[1], name, dtype=object) for name, matrix in matrices.items()])
+    return values, times, directions
+
+def outlier_report(matrices, whisker=1.5):
+    """Per-relay outlier summary and one row per outlier event.
+
+    matrices maps a direction name to a RelayMatrix; all share the same relays
+    and grid (see direction_matrices). Each cell is one sample, so the grid
+    step should match the resolution of the data.
+    """
+    import numpy as np
+    import pandas as pd
+    first = next(iter(matrices.values()))
+    values, times, directions = direction_values(matrices)
+    mask, (q25, q75, lower, upper) = iqr_outliers(values, whisker)
+    counts = mask.sum(axis=1)
+    samples = np.count_nonzero(~np.isnan(values), axis=1)
+    summary = pd.DataFrame({
+        "Fingerprint": first.fingerprints,
+        "Samples": samples,
+        "Q1": q25,
+        "Q3": q75,
+        "IQR": q75 - q25,
+        "Lower Bound": lower,
+        "Upper Bound": upper,
+        "Outliers": counts,
+        "Outlier Fraction": np.where(samples > 0, counts / np.maximum(samples, 1), np.nan),
+    })
+
+    relay_index, column = np.nonzero(mask)
+    event_values = values[relay_index, column]
+    events = pd.DataFrame({
+        "Fingerprint": first.fingerprints[relay_index],
+        "Timestamp": pd.to_datetime(times[column], unit='s', utc=True).strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+        "Direction": directions[column],
+        "Value": event_values,
+        "Side": np.where(event_values > upper[relay_index], 'high', 'low'),
+    })
+    return summary, events.sort_values(["Fingerprint", "Timestamp"], ignore_index=True)
+
+def direction_matrices(fingerprints, timestamps, directions, values, start, end, step, direction=None):
+    """One RelayMatrix per direction (or only direction), all with the same relays as rows."""
+    import numpy as np
+    import series
+    fingerprints = np.asarray(fingerprints, dtype=object)
+    directions = np.asarray(directions, dtype=object)
+    relays = np.unique(fingerprints.astype(str))
+    matrices = {}
+    for name in [direction] if direction else ['Read', 'Write']:
+        keep = directions == name
+        matrices[name] = series.build_matrix(fingerprints[keep], np.asarray(timestamps)[keep],
+                                             np.asarray(values)[keep], start, end, step, relays=relays)
+    return matrices
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Find IQR outliers in every relay\'s bandwidth history at once.')
+    parser.add_argument('--resolution', type=int, default=3600,
+                        help='Grid resolution in seconds; samples sharing a cell are averaged into one.')
+    parser.add_argument('--whisker', type=float, default=1.5, help='Outlier fence in IQRs beyond the quartiles.')
+    parser.add_argument('--direction', choices=['Read', 'Write'], help='Use one direction only (default: both pooled).')
+    parser.add_argument('--output', default='relay_outliers.csv', help='Per-relay outlier summary.')
+    parser.add_argument('--events-output', default='relay_outlier_events.csv', help='One row per outlier sample.')
+    add_matrix_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    start, end = window_from_args(args)
+    # Grid aligned to the resolution so event timestamps are the samples' own times
+    grid = (int(start.timestamp()) // args.resolution * args.resolution, int(end.timestamp()))
+    columns = columns_from_args(args, (start, end))
+
+    matrices = direction_matrices(*columns, *grid, args.resolution, args.direction)
+    summary, events = outlier_report(matrices, args.whisker)
+    summary.to_csv(args.output, index=False)
+    events.to_csv(args.events_output, index=False)
+    log.info("Found %d outliers in %d of %d relays; saved to '%s' and '%s'.", len(events),
+             int((summary['Outliers'] > 0).sum()), len(summary), args.output, args.events_output)
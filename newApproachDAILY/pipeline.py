@@ -0,0 +1,211 @@
+# pipeline.py
+import argparse
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import calculate
+import fetch_data
+import query_fingerprints
+import visualize
+from retry_queue import DeferredRetryQueue
+from metrics import ROWS, STAGE_SECONDS, add_metrics_arguments, finish_metrics, start_metrics
+from progress import add_logging_arguments, configure_logging
+from profiling import PROFILER, add_profile_arguments, finish_profiling, start_profiling
+
+log = logging.getLogger(__name__)
+
+CACHE_FILE = '.pipeline_cache.json'
+
+class Stage:
+    """A pipeline step with declared input files, output files and parameters.
+
+    The cache key of a stage is a content hash over its input files, its
+    parameters and the source of the modules that implement it. Stages that
+    talk to Onionoo are marked ``daily`` so their key also includes the current
+    UTC date, since their inputs live on the network rather than on disk.
+    """
+
+    def __init__(self, name, run, inputs, outputs, params=None, modules=(), daily=False):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.modules = list(modules)
+        self.daily = daily
+
+    def cache_key(self):
+        digest = hashlib.sha256()
+        digest.update(self.name.encode())
+        digest.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        if self.daily:
+            digest.update(datetime.now(timezone.utc).date().isoformat().encode())
+        for module in self.modules:
+            digest.update(hash_file(module.__file__).encode())
+        for path in self.inputs:
+            digest.update(path.encode())
+            digest.update(hash_file(path).encode())
+        return digest.hexdigest()
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_cache(cache, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_cached(stage, key, cache):
+    entry = cache.get(stage.name)
+    if not entry or entry.get('key') != key:
+        return False
+    # Outputs must still exist and be unchanged since the stage wrote them
+    for path in stage.outputs:
+        if not os.path.exists(path) or hash_file(path) != entry['outputs'].get(path):
+            return False
+    return True
+
+def run_fingerprints_stage(inputs, outputs, params):
+    fingerprints = query_fingerprints.fetch_relay_fingerprints()
+    query_fingerprints.save_fingerprints_to_csv(fingerprints, outputs[0])
+
+def run_fetch_stage(inputs, outputs, params):
+    fingerprints, _ = fetch_data.read_fingerprints_csv(inputs[0])
+    retry_queue = DeferredRetryQueue()
+    fetch_data.fetch_bandwidth_data_streaming(
+        fingerprints, outputs[0], months_ago=params['months_ago'], month_duration=params['month_duration'],
+        retry_queue=retry_queue
+    )
+    retry_queue.write_manifest(outputs[1])
+
+def run_stats_stage(inputs, outputs, params):
+    import pandas as pd
+    df = pd.read_csv(inputs[0])
+    calculate.calculate_statistics(df).to_csv(outputs[0], index=False)
+
+def run_in_memory_stage(inputs, outputs, params):
+    # Fetch, extract and stats in one process: columnar batches go straight from
+    # the fetchers into the statistics, optionally tee'd to the data CSV on the way
+    fingerprints, _ = fetch_data.read_fingerprints_csv(inputs[0])
+    retry_queue = DeferredRetryQueue()
+    batches = fetch_data.fetch_bandwidth_batches(
+        fingerprints, months_ago=params['months_ago'], month_duration=params['month_duration'], retry_queue=retry_queue
+    )
+    if params['materialize']:
+        batches = materialize_batches(batches, outputs[2])
+    calculate.calculate_statistics_from_batches(batches).to_csv(outputs[0], index=False)
+    retry_queue.write_manifest(outputs[1])
+
+def materialize_batches(batches, output_csv):
+    header = True
+    with open(output_csv, 'w', newline='') as f:
+        for batch in batches:
+            with STAGE_SECONDS.time(stage='write'):
+                fetch_data.batch_to_frame(batch).to_csv(f, header=header, index=False)
+            ROWS.inc(len(batch['Value']), stage='write')
+            header = False
+            yield batch
+        if header:
+            f.write('Fingerprint,Timestamp,Direction,Value\n')
+
+def run_visualize_stage(inputs, outputs, params):
+    import pandas as pd
+    data = pd.read_csv(inputs[0])
+    visualize.plot_relay_statistics(data, cov_output=outputs[0], std_output=outputs[1], **params)
+
+def build_stages(args):
+    def path(name):
+        return os.path.join(args.workdir, name)
+
+    fingerprints_csv = args.fingerprints_csv or path('relay_fingerprints.csv')
+    stages = []
+    if not args.fingerprints_csv:
+        stages.append(Stage('fingerprints', run_fingerprints_stage, [], [fingerprints_csv],
+                            modules=[query_fingerprints], daily=True))
+    window = {'months_ago': args.months_ago, 'month_duration': args.month_duration}
+    if args.in_memory:
+        outputs = [path('relay_bandwidth_stats.csv'), path('failed_fingerprints.csv')]
+        if args.materialize:
+            outputs.append(path('relay_bandwidth_data.csv'))
+        stages.append(Stage('fetch+stats', run_in_memory_stage, [fingerprints_csv], outputs,
+                            params=dict(window, materialize=args.materialize),
+                            modules=[fetch_data, calculate], daily=True))
+    else:
+        stages += [
+            Stage('fetch', run_fetch_stage, [fingerprints_csv],
+                  [path('relay_bandwidth_data.csv'), path('failed_fingerprints.csv')],
+                  params=window, modules=[fetch_data], daily=True),
+            Stage('stats', run_stats_stage, [path('relay_bandwidth_data.csv')], [path('relay_bandwidth_stats.csv')],
+                  modules=[calculate]),
+        ]
+    stages += [
+        Stage('visualize', run_visualize_stage, [path('relay_bandwidth_stats.csv')],
+              [path('cov_cdf.png'), path('std_dev_cdf.png')],
+              params={'cov_x_max': args.cov_x_max, 'cov_tick_step': args.cov_tick_step,
+                      'std_num_ticks': args.std_num_ticks, 'hline_y': args.hline_y},
+              modules=[visualize]),
+    ]
+    return stages
+
+def run_pipeline(stages, cache_path, force=()):
+    cache = load_cache(cache_path)
+    for stage in stages:
+        key = stage.cache_key()
+        if stage.name not in force and is_cached(stage, key, cache):
+            log.info("[%s] cached output is up to date, skipping.", stage.name)
+            continue
+
+        log.info("[%s] running...", stage.name)
+        with PROFILER.stage(stage.name):
+            stage.run(stage.inputs, stage.outputs, stage.params)
+        cache[stage.name] = {
+            'key': key,
+            'outputs': {path: hash_file(path) for path in stage.outputs},
+            'completed': datetime.now(timezone.utc).isoformat(),
+        }
+        # Persist after every stage so an interrupted run keeps finished work
+        save_cache(cache, cache_path)
+        log.info("[%s] done.", stage.name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the daily relay bandwidth pipeline, skipping stages whose cached output is still valid.')
+    parser.add_argument('--fingerprints-csv', help='Use an existing fingerprint CSV instead of querying Onionoo.')
+    parser.add_argument('--workdir', default='.', help='Directory for intermediate and final outputs.')
+    parser.add_argument('--months-ago', type=int, default=2, help='Start of the window, in 30-day months before today.')
+    parser.add_argument('--month-duration', type=int, default=1, help='Length of the window in 30-day months.')
+    parser.add_argument('--cov-x-max', type=float, default=2.0, help='Upper x-axis limit of the CoV CDF.')
+    parser.add_argument('--cov-tick-step', type=float, default=0.2, help='Tick spacing on the CoV CDF.')
+    parser.add_argument('--std-num-ticks', type=int, default=10, help='Number of ticks on the standard deviation CDF.')
+    parser.add_argument('--hline-y', type=float, default=0.5, help='Height of the reference line on the CoV CDF.')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='Hand columnar batches from fetch to stats in memory instead of round-tripping through relay_bandwidth_data.csv.')
+    parser.add_argument('--materialize', action='store_true',
+                        help='With --in-memory, also write relay_bandwidth_data.csv.')
+    parser.add_argument('--force', action='append', default=[], metavar='STAGE',
+                        help='Re-run a stage even if its cache is valid (repeatable).')
+    add_metrics_arguments(parser)
+    add_logging_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+    start_metrics(args)
+    start_profiling(args)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    run_pipeline(build_stages(args), os.path.join(args.workdir, CACHE_FILE), force=set(args.force))
+    finish_metrics(args)
+    finish_profiling(args)
@@ -0,0 +1,74 @@
+# priority.py
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from onionoo import build_query_url, open_session
+
+log = logging.getLogger(__name__)
+
+PRIORITY_KEYS = ['csv', 'consensus_weight', 'advertised_bandwidth', 'last_fetched']
+
+def fetch_relay_weights(client_options=None):
+    """Return {fingerprint: {'consensus_weight': ..., 'advertised_bandwidth': ...}} for all relays.
+
+    One details request with only the needed fields, so it stays small. It goes
+    through the same client as the bandwidth fetches (mirrors, HTTP/2, record or
+    replay).
+    """
+    params = {'type': 'relay', 'fields': ['fingerprint', 'consensus_weight', 'advertised_bandwidth']}
+    url = build_query_url('details', **params)
+    with open_session(client_options) as session:
+        response = session.get(url, timeout=60)
+        response.raise_for_status()
+    return {relay['fingerprint']: relay for relay in response.json().get('relays', [])}
+
+def load_fetch_history(filename='fetch_history.json'):
+    """Return {fingerprint: ISO timestamp of the last successful fetch}."""
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+def record_fetch_history(fingerprints, filename='fetch_history.json'):
+    """Mark fingerprints as successfully fetched now."""
+    history = load_fetch_history(filename)
+    now = datetime.now(timezone.utc).isoformat()
+    history.update({fp: now for fp in fingerprints})
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(history, f)
+    os.replace(tmp_filename, filename)
+
+def order_fingerprints(fingerprints, key='csv', history_filename='fetch_history.json', client_options=None):
+    """Return fingerprints ordered so the most important relays are fetched first.
+
+    consensus_weight and advertised_bandwidth order by descending weight;
+    last_fetched puts never-fetched relays first, then the stalest. Relays
+    without a value keep their CSV order after those that have one.
+    """
+    if key == 'csv':
+        return list(fingerprints)
+    if key == 'last_fetched':
+        history = load_fetch_history(history_filename)
+        # ISO timestamps sort chronologically; '' sorts before any of them
+        return sorted(fingerprints, key=lambda fp: history.get(fp, ''))
+    if key not in PRIORITY_KEYS:
+        raise ValueError(f"Unknown priority key: {key}")
+
+    weights = fetch_relay_weights(client_options)
+    def weight(fp):
+        value = weights.get(fp, {}).get(key)
+        return (value is None, -(value or 0))
+    return sorted(fingerprints, key=weight)
+
+def until_deadline(fingerprints, time_budget):
+    """Yield fingerprints until time_budget seconds have passed, so a time-boxed run stops taking new work."""
+    deadline = time.monotonic() + time_budget
+    for fp in fingerprints:
+        if time.monotonic() >= deadline:
+            log.info("Time budget of %.0fs exhausted; not starting further relays.", time_budget)
+            return
+        yield fp
@@ -0,0 +1,140 @@
+# profiling.py
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+class StageProfiler:
+    """Wraps pipeline stages in cProfile and tracemalloc when profiling is enabled.
+
+    Each stage gets a deterministic profile covering the calling thread and
+    every thread started during the stage (the fetch and extract workers), saved
+    as <output_dir>/<stage>.prof for pstats or snakeviz. tracemalloc reports the
+    peak Python allocation within the stage. On Python 3.12+ the calling
+    thread's profiler already sees every thread (and a second one cannot
+    start), so threads only get their own profilers on older versions. A stage
+    entered several times, e.g. once per relay, accumulates into one profile.
+    When disabled, stage() does nothing, so the hooks can stay in the code
+    permanently.
+    """
+
+    def __init__(self, enabled=False, output_dir='profiles'):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.results = {}  # stage -> {'wall', 'cpu', 'peak', 'calls', 'stats'}
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        profiles = []
+        lock = threading.Lock()
+
+        def bootstrap(frame, event, arg):
+            # First profile event in a thread started during the stage: give it its own profiler
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return  # Another profiler is active in this thread; never let that kill the thread
+            with lock:
+                profiles.append(profiler)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        main = cProfile.Profile()
+        per_thread = sys.version_info < (3, 12)
+        if per_thread:
+            threading.setprofile(bootstrap)
+        wall, cpu = time.perf_counter(), time.process_time()
+        main.enable()
+        try:
+            yield
+        finally:
+            main.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if per_thread:
+                threading.setprofile(None)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            if started_tracing:
+                tracemalloc.stop()
+            self.record(name, wall, cpu, peak, [main] + profiles)
+
+    def record(self, name, wall, cpu, peak, profiles):
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            # Worker threads have finished by now; a profile that never saw a call has nothing to add
+            try:
+                stats.add(profile)
+            except TypeError:
+                pass
+        entry = self.results.get(name)
+        if entry is None:
+            self.results[name] = {'wall': wall, 'cpu': cpu, 'peak': peak, 'calls': 1, 'stats': stats}
+        else:
+            entry['wall'] += wall
+            entry['cpu'] += cpu
+            entry['peak'] = max(entry['peak'], peak)
+            entry['calls'] += 1
+            entry['stats'].add(stats)
+
+    def top_functions(self, stats, count=3):
+        # Functions with the most time spent in their own body, which is where hot loops show up
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+        return [f"{pstats.func_std_string(func).split('/')[-1]} {timing[2]:.2f}s" for func, timing in rows]
+
+    def summary(self):
+        lines = [f"{'Stage':<16} {'Calls':>6} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak MB':>9}  Top self time"]
+        for name, entry in self.results.items():
+            lines.append(f"{name:<16} {entry['calls']:>6} {entry['wall']:>9.2f} {entry['cpu']:>9.2f} "
+                         f"{entry['peak'] / 2 ** 20:>9.1f}  {'; '.join(self.top_functions(entry['stats']))}")
+        return '\n'.join(lines)
+
+    def write(self):
+        """Save one .prof file and a text report per stage plus summary.txt; returns the summary table."""
+        if not self.enabled or not self.results:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        for name, entry in self.results.items():
+            filename = os.path.join(self.output_dir, name.replace('/', '_').replace('+', '_'))
+            entry['stats'].dump_stats(filename + '.prof')
+            report = io.StringIO()
+            pstats.Stats(filename + '.prof', stream=report).sort_stats('cumulative').print_stats(40)
+            with open(filename + '.txt', 'w') as f:
+                f.write(report.getvalue())
+        summary = self.summary()
+        with open(os.path.join(self.output_dir, 'summary.txt'), 'w') as f:
+            f.write(summary + '\n')
+        return summary
+
+PROFILER = StageProfiler()
+
+def add_profile_arguments(parser):
+    group = parser.add_argument_group('Profiling options')
+    group.add_argument('--profile', action='store_true',
+                       help='Profile each stage with cProfile and tracemalloc and print a summary table.')
+    group.add_argument('--profile-dir', default='profiles', help='Directory for per-stage .prof and .txt files.')
+    return group
+
+def start_profiling(args):
+    PROFILER.enabled = args.profile
+    PROFILER.output_dir = args.profile_dir
+
+def finish_profiling(args):
+    summary = PROFILER.write()
+    if summary:
+        print(summary)
+        log.info("Wrote per-stage profiles to '%s'.", args.profile_dir)
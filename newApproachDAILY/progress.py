@@ -0,0 +1,70 @@
+# progress.py
+import logging
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+class Progress:
+    """Thread-safe progress counter that logs at most one line every interval seconds.
+
+    Workers call update() once per relay; only the call that crosses the
+    interval formats and logs a line with throughput, ETA and error count, so
+    the per-relay cost is a lock and a clock read rather than a write to stdout.
+    """
+
+    def __init__(self, total, label='relays', interval=5.0, logger=log):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.logger = logger
+        self.done = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self.next_report = self.started + interval
+        self.lock = threading.Lock()
+
+    def update(self, ok=True, count=1):
+        with self.lock:
+            self.done += count
+            if not ok:
+                self.errors += count
+            now = time.monotonic()
+            if now < self.next_report:
+                return
+            self.next_report = now + self.interval
+            message = self.format(now)
+        self.logger.info(message)
+
+    def format(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        message = f"{self.done}/{self.total} {self.label} ({rate:.1f}/s"
+        if rate > 0 and self.total > self.done:
+            message += f", ETA {format_duration((self.total - self.done) / rate)}"
+        return message + f", {self.errors} failed)"
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        self.logger.info(f"Finished {self.done}/{self.total} {self.label} in {format_duration(elapsed)}, "
+                         f"{self.errors} failed.")
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+def add_logging_arguments(parser):
+    group = parser.add_argument_group('Logging options')
+    verbosity = group.add_mutually_exclusive_group()
+    verbosity.add_argument('-q', '--quiet', action='store_true', help='Only log warnings and errors; no progress lines.')
+    verbosity.add_argument('-v', '--verbose', action='store_true', help='Also log per-relay detail.')
+    return group
+
+def configure_logging(args):
+    level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=level, format='%(asctime)s %(levelname)s %(message)s', datefmt='%H:%M:%S',
+                        stream=sys.stderr)
+    # Connection-pool chatter would drown out the per-relay lines in verbose mode
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
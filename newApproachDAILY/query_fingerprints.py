@@ -1,49 +1,147 @@
-import requests
-import pandas as pd
+import argparse
+import json
+import os
 import time
+from onionoo import (add_client_arguments, add_query_arguments, build_query_url, client_options_from_args,
+                     open_session, query_params_from_args)
 
-def fetch_relay_fingerprints():
-    """Fetch a list of relay fingerprints."""
+def fetch_relay_fingerprints(if_modified_since=None, page_delay=1.0, response_info=None, query_params=None,
+                             client_options=None):
+    """Fetch a list of relay fingerprints.
+
+    When if_modified_since is given the first page is requested conditionally
+    and None is returned if Onionoo answers 304 Not Modified. The response's
+    Last-Modified header is stored in response_info when a dict is passed.
+    query_params holds server-side filters such as running, type and flag;
+    client_options may list mirrors to spread the summary pages across.
+    """
     limit = 5000  # Maximum allowed by the Onionoo API
     offset = 0
     fingerprints = []
+    with open_session(client_options) as session:
+        while True:
+            url = build_query_url('summary', limit=limit, offset=offset, **(query_params or {}))
+            headers = {'If-Modified-Since': if_modified_since} if if_modified_since and offset == 0 else {}
+            response = session.get(url, headers=headers)
+            if response.status_code == 304:
+                return None
+            if response.status_code != 200:
+                print(f"Error: {response.status_code} - {response.text}")
+                raise Exception("Failed to fetch relay fingerprints")
+
+            if offset == 0 and response_info is not None:
+                response_info['last_modified'] = response.headers.get('Last-Modified')
+
+            data = response.json()
+            relays = data.get('relays', [])
+
+            if not relays:
+                print("No relays found in the response.")
+                break
 
-    while True:
-        url = f'https://onionoo.torproject.org/summary?limit={limit}&offset={offset}'
-        response = requests.get(url)
-        if response.status_code != 200:
-            print(f"Error: {response.status_code} - {response.text}")
-            raise Exception("Failed to fetch relay fingerprints")
-
-        data = response.json()
-        relays = data.get('relays', [])
-
-        if not relays:
-            print("No relays found in the response.")
-            break
-
-        # Ensure each relay has a 'fingerprint' key before accessing
-        for relay in relays:
-            # Check for 'fingerprint' or fallback key 'f'
-            fingerprint = relay.get('fingerprint') or relay.get('f')
-            if fingerprint:
-                fingerprints.append(fingerprint)
-            else:
-                print(f"Warning: 'fingerprint' key not found in relay data: {relay}")
-
-        if len(relays) < limit:
-            break
-        offset += limit
-        time.sleep(1)  # Avoid overloading the server
+            # Ensure each relay has a 'fingerprint' key before accessing
+            for relay in relays:
+                # Check for 'fingerprint' or fallback key 'f'
+                fingerprint = relay.get('fingerprint') or relay.get('f')
+                if fingerprint:
+                    fingerprints.append(fingerprint)
+                else:
+                    print(f"Warning: 'fingerprint' key not found in relay data: {relay}")
+
+            if len(relays) < limit:
+                break
+            offset += limit
+            time.sleep(page_delay)  # Avoid overloading the server
 
     return fingerprints
 
 def save_fingerprints_to_csv(fingerprints, filename='relay_fingerprints.csv'):
     """Save fingerprints to CSV."""
+    import pandas as pd
     df = pd.DataFrame(fingerprints, columns=['Fingerprint'])
     df.to_csv(filename, index=False)
     print(f"Saved {len(fingerprints)} fingerprints to {filename}")
 
+def load_fingerprints_from_csv(filename='relay_fingerprints.csv'):
+    """Load previously saved fingerprints, or an empty list if there are none."""
+    import pandas as pd
+    if not os.path.exists(filename):
+        return []
+    return pd.read_csv(filename)['Fingerprint'].tolist()
+
+def diff_fingerprints(previous, current):
+    """Return (added, removed) fingerprints between two runs, each sorted."""
+    previous, current = set(previous), set(current)
+    return sorted(current - previous), sorted(previous - current)
+
+def save_delta_to_csv(added, removed, filename='relay_fingerprints_delta.csv'):
+    """Save a fingerprint delta with one row per added or removed relay."""
+    import pandas as pd
+    rows = [(fp, 'added') for fp in added] + [(fp, 'removed') for fp in removed]
+    df = pd.DataFrame(rows, columns=['Fingerprint', 'Change'])
+    df.to_csv(filename, index=False)
+    print(f"Saved delta ({len(added)} added, {len(removed)} removed) to {filename}")
+
+def load_state(filename):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+def save_state(state, filename):
+    with open(filename, 'w') as f:
+        json.dump(state, f, indent=2)
+
+def discover_incremental(filename='relay_fingerprints.csv', delta_filename='relay_fingerprints_delta.csv',
+                         state_filename='relay_fingerprints_state.json', page_delay=1.0, query_params=None,
+                         client_options=None):
+    """Refresh the fingerprint list only if Onionoo has published a newer summary.
+
+    Returns (added, removed). Both are empty when the summary is unchanged,
+    in which case the fingerprint CSV is kept and an empty delta is written so
+    a stale delta is never applied twice downstream. The filters are stored
+    with Last-Modified, and changing them forces a full fetch.
+    """
+    previous = load_fingerprints_from_csv(filename)
+    state = load_state(state_filename)
+    # Compared as stored in the state file, so tuples and lists match after a round trip
+    filters = json.loads(json.dumps({key: value for key, value in (query_params or {}).items() if value is not None}))
+    # Without a previous relay set filtered the same way there is nothing to diff against, so fetch unconditionally
+    unchanged = previous and state.get('query_params') == filters
+    if_modified_since = state.get('last_modified') if unchanged else None
+
+    response_info = {}
+    current = fetch_relay_fingerprints(if_modified_since, page_delay=page_delay, response_info=response_info,
+                                       query_params=query_params, client_options=client_options)
+    if current is None:
+        print(f"Summary not modified since {if_modified_since}; keeping {len(previous)} fingerprints.")
+        save_delta_to_csv([], [], delta_filename)
+        return [], []
+
+    added, removed = diff_fingerprints(previous, current)
+    save_fingerprints_to_csv(current, filename)
+    save_delta_to_csv(added, removed, delta_filename)
+    save_state({'last_modified': response_info.get('last_modified'), 'query_params': filters}, state_filename)
+    return added, removed
+
 if __name__ == "__main__":
-    fingerprints = fetch_relay_fingerprints()
-    save_fingerprints_to_csv(fingerprints)
+    parser = argparse.ArgumentParser(description='Fetch relay fingerprints from Onionoo.')
+    parser.add_argument('--output', default='relay_fingerprints.csv', help='Fingerprint CSV to write.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Fetch conditionally and write added/removed fingerprints relative to the previous run.')
+    parser.add_argument('--delta-output', default='relay_fingerprints_delta.csv', help='Delta CSV written in incremental mode.')
+    parser.add_argument('--state', default='relay_fingerprints_state.json', help='State file holding the last Last-Modified header.')
+    parser.add_argument('--page-delay', type=float, default=1.0, help='Seconds to wait between summary pages.')
+    add_query_arguments(parser)
+    add_client_arguments(parser)
+    args = parser.parse_args()
+    query_params = query_params_from_args(args)
+    client_options = client_options_from_args(args)
+
+    if args.incremental:
+        discover_incremental(args.output, args.delta_output, args.state, page_delay=args.page_delay,
+                             query_params=query_params, client_options=client_options)
+    else:
+        fingerprints = fetch_relay_fingerprints(page_delay=args.page_delay, query_params=query_params,
+                                                client_options=client_options)
+        save_fingerprints_to_csv(fingerprints, args.output)
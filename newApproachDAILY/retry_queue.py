@@ -0,0 +1,60 @@
+# retry_queue.py
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+class DeferredRetryQueue:
+    """Collects fingerprints whose fetch failed so they can be retried after the main pass.
+
+    The main pass fetches with few retries and defers failures here instead of
+    blocking on long backoffs. drain() then retries the deferred fingerprints in
+    rounds separated by growing pauses; whatever still fails is written to a
+    manifest so gaps in the statistics are recorded rather than silent.
+    """
+
+    def __init__(self, rounds=3, backoff=30.0, workers=2):
+        self.rounds = rounds
+        self.backoff = backoff
+        self.workers = workers
+        self.pending = set()
+        self.attempts = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def defer(self, fingerprint, error):
+        with self.lock:
+            self.pending.add(fingerprint)
+            self.attempts[fingerprint] = self.attempts.get(fingerprint, 0) + 1
+            self.errors[fingerprint] = str(error)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def drain(self, run_round):
+        """Retry deferred fingerprints; run_round(fingerprints) must fetch them with this queue attached.
+
+        Fingerprints that fail again are re-deferred by the fetcher and picked up
+        by the next round. Returns the fingerprints that failed every round.
+        """
+        for round_number in range(1, self.rounds + 1):
+            with self.lock:
+                fingerprints = sorted(self.pending)
+                self.pending.clear()
+            if not fingerprints:
+                break
+            delay = self.backoff * 2 ** (round_number - 1)
+            log.info("Retrying %d failed relays in %.0fs (round %d/%d)...", len(fingerprints), delay, round_number, self.rounds)
+            time.sleep(delay)
+            run_round(fingerprints)
+        with self.lock:
+            return sorted(self.pending)
+
+    def write_manifest(self, filename='failed_fingerprints.csv'):
+        import pandas as pd
+        with self.lock:
+            rows = [(fp, self.attempts[fp], self.errors[fp]) for fp in sorted(self.pending)]
+        pd.DataFrame(rows, columns=['Fingerprint', 'Attempts', 'Last Error']).to_csv(filename, index=False)
+        log.info("Recorded %d relays that could not be fetched in %s", len(rows), filename)
@@ -0,0 +1,82 @@
+# rolling.py
+import argparse
+import logging
+
+from progress import add_logging_arguments, configure_logging
+from series import add_matrix_arguments, matrix_from_args, window_from_args
+
+log = logging.getLogger(__name__)
+
+SERIES = ('samples', 'mean', 'std', 'cov')
+
+def rolling_statistics(matrix, window, step=1, min_samples=2):
+    """Rolling per-relay mean, std and CoV over a RelayMatrix.
+
+    window and step are in matrix columns. Moving the window by one step adds
+    the columns that enter and removes the ones that leave, which on the
+    matrix's prefix sums is a subtraction per relay, done for all relays and
+    all positions at once. Windows with fewer than min_samples samples are NaN.
+    Returns a dict of arrays: fingerprints, window end times (epoch seconds)
+    and relays × windows samples, mean, std and cov.
+    """
+    import numpy as np
+    n_columns = matrix.shape[1]
+    ends = np.arange(window, n_columns + 1, step)
+    starts = ends - window
+    n, mean, std, cov = matrix.window_statistics(starts, ends)
+    sparse = n < min_samples
+    result = {
+        'fingerprints': np.asarray(matrix.fingerprints, dtype=str),
+        'times': (matrix.start + ends * matrix.step).astype(np.int64),
+        'window': np.int64(window * matrix.step),
+        'samples': n.astype(np.int32),
+    }
+    for name, values in (('mean', mean), ('std', std), ('cov', cov)):
+        # float32 halves the file size; the statistics do not need more precision
+        result[name] = np.where(sparse, np.nan, values).astype(np.float32)
+    return result
+
+def write_rolling(path, result):
+    """Save rolling series as a compressed .npz: one relays × windows array per statistic."""
+    import numpy as np
+    np.savez_compressed(path, **result)
+
+def load_rolling(path):
+    import numpy as np
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+def relay_series(result, fingerprint):
+    """One relay's rolling series as a DataFrame indexed by window end, for plotting."""
+    import numpy as np
+    import pandas as pd
+    row = np.flatnonzero(result['fingerprints'] == fingerprint)
+    if not len(row):
+        raise KeyError(fingerprint)
+    index = pd.to_datetime(result['times'], unit='s', utc=True)
+    return pd.DataFrame({name: result[name][row[0]] for name in SERIES}, index=index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compute rolling per-relay mean, std and CoV series.')
+    parser.add_argument('--window-days', type=float, default=7, help='Rolling window length in days.')
+    parser.add_argument('--step-hours', type=float, default=24, help='Distance between consecutive windows in hours.')
+    parser.add_argument('--resolution', type=int, default=3600,
+                        help='Grid resolution in seconds; window and step are rounded to it.')
+    parser.add_argument('--min-samples', type=int, default=2, help='Leave windows with fewer samples empty.')
+    parser.add_argument('--direction', choices=['Read', 'Write'], help='Use one direction only (default: both pooled).')
+    parser.add_argument('--output', default='relay_bandwidth_rolling.npz', help='Output .npz file.')
+    add_matrix_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    start, end = window_from_args(args)
+    grid = (int(start.timestamp()), int(end.timestamp()))
+    matrix = matrix_from_args(args, (start, end), grid, args.resolution, args.direction)
+
+    window = max(round(args.window_days * 86400 / args.resolution), 1)
+    step = max(round(args.step_hours * 3600 / args.resolution), 1)
+    result = rolling_statistics(matrix, window, step, args.min_samples)
+    write_rolling(args.output, result)
+    log.info("Saved %d rolling windows for %d relays to '%s'.", len(result['times']), len(result['fingerprints']),
+             args.output)
@@ -0,0 +1,120 @@
+# seasonality.py
+import argparse
+import logging
+
+from progress import add_logging_arguments, configure_logging
+from series import add_matrix_arguments, matrix_from_args, window_from_args
+
+log = logging.getLogger(__name__)
+
+# Cycles removed in order, in seconds
+PERIODS = (('Daily', 86400), ('Weekly', 7 * 86400))
+
+def sum_of_squares(values):
+    import numpy as np
+    with np.errstate(invalid='ignore'):
+        return np.nansum((values - np.nanmean(values, axis=1, keepdims=True)) ** 2, axis=1)
+
+def seasonal_component(values, period):
+    """Each relay's average profile over a cycle of period columns, repeated over the series.
+
+    Columns are grouped by their phase (column index modulo period) with one
+    matrix product against a columns × period indicator matrix, which averages
+    all relays' cycles at once and skips NaN gaps. The profile is centred, so
+    removing it keeps each relay's mean. Also returns how many phases each
+    relay has data for, i.e. how many profile values were estimated.
+    """
+    import numpy as np
+    present = ~np.isnan(values)
+    phase = np.arange(values.shape[1]) % period
+    indicator = np.zeros((values.shape[1], period))
+    indicator[np.arange(values.shape[1]), phase] = 1
+    counts = present @ indicator
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profile = (np.where(present, values, 0) @ indicator) / counts
+        profile -= np.nanmean(profile, axis=1, keepdims=True)
+    return np.nan_to_num(profile)[:, phase], np.count_nonzero(counts, axis=1)
+
+def dominant_period(values, step):
+    """Period (seconds) of the strongest Fourier component of each relay's gap-filled series.
+
+    Periods longer than half the series are ignored, since fewer than two
+    cycles cannot establish one. NaN for relays without data.
+    """
+    import numpy as np
+    with np.errstate(invalid='ignore'):
+        centered = np.nan_to_num(values - np.nanmean(values, axis=1, keepdims=True))
+    power = np.abs(np.fft.rfft(centered, axis=1)) ** 2
+    columns = values.shape[1]
+    if power.shape[1] <= 2:
+        return np.full(len(values), np.nan)
+    peak = power[:, 2:].argmax(axis=1) + 2
+    return np.where(power[:, 2:].max(axis=1) > 0, columns * step / peak, np.nan)
+
+def decompose(matrix, periods=PERIODS):
+    """Seasonal strength, dominant period and deseasonalized CoV for every relay.
+
+    Cycles are removed one after another by aligned averaging (seasonal_component).
+    Strength of a cycle is the share of variance it explains, 1 - var(after) /
+    var(before), clipped to [0, 1]; seasonal strength is the same for all
+    cycles together. Residual variances are corrected for the profile values
+    fitted (like an adjusted R²), so noise alone does not look seasonal when a
+    long cycle has only a few repetitions. Deseasonalized CoV is the residual
+    standard deviation over the mean, so a relay that only follows a daily
+    rhythm scores low even if its plain CoV is high. Statistics are over grid
+    cells, not raw samples.
+    """
+    import numpy as np
+    import pandas as pd
+    values = matrix.values()
+    samples = np.count_nonzero(~np.isnan(values), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(values, axis=1)
+    variance = sum_of_squares(values) / (samples - 1)
+
+    result = {
+        "Fingerprint": matrix.fingerprints,
+        "Samples": samples,
+        "Mean Bandwidth": mean,
+        "Coefficient of Variation": np.sqrt(variance) / mean,
+        "Dominant Period (h)": dominant_period(values, matrix.step) / 3600,
+    }
+    residual = values
+    fitted = 0  # Profile values estimated so far, less one per cycle for the centring
+    with np.errstate(invalid='ignore', divide='ignore'):
+        residual_variance = variance
+        for name, seconds in periods:
+            period = int(round(seconds / matrix.step))
+            if period < 2 or period > values.shape[1] // 2:
+                log.warning("Skipping %s cycle: needs at least two cycles of two or more columns.", name.lower())
+                continue
+            before = residual_variance
+            component, phases = seasonal_component(residual, period)
+            residual = residual - component
+            fitted += np.maximum(phases - 1, 0)
+            residual_variance = sum_of_squares(residual) / (samples - 1 - fitted)
+            result[f"{name} Strength"] = np.clip(1 - residual_variance / before, 0, 1)
+        result["Seasonal Strength"] = np.clip(1 - residual_variance / variance, 0, 1)
+        result["Residual Variance"] = residual_variance
+        result["Deseasonalized CoV"] = np.sqrt(residual_variance) / mean
+    return pd.DataFrame(result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Separate daily and weekly cycles from bandwidth instability per relay.')
+    parser.add_argument('--resolution', type=int, default=4 * 3600,
+                        help='Grid resolution in seconds; must resolve a day into at least two columns.')
+    parser.add_argument('--direction', choices=['Read', 'Write'], help='Use one direction only (default: both averaged).')
+    parser.add_argument('--output', default='relay_seasonality.csv', help='Output CSV.')
+    add_matrix_arguments(parser, months_ago=1)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    start, end = window_from_args(args)
+    # Aligned to whole days so phase 0 of the daily cycle is midnight UTC
+    grid = (int(start.timestamp()) // 86400 * 86400, int(end.timestamp()))
+    matrix = matrix_from_args(args, (start, end), grid, args.resolution, args.direction)
+
+    results = decompose(matrix)
+    results.to_csv(args.output, index=False)
+    log.info("Saved seasonality for %d relays to '%s'.", len(results), args.output)
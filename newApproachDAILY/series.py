@@ -0,0 +1,200 @@
+# series.py
+import os
+
+import numpy as np
+
+from onionoo import BANDWIDTH_FIELDS, add_client_arguments, add_query_arguments, client_options_from_args, query_params_from_args
+
+class RelayMatrix:
+    """Per-relay bandwidth binned onto a regular time grid: one row per relay, one column per step.
+
+    Each cell keeps the number of samples, their sum and their sum of squares
+    rather than a single value, so statistics over any run of columns can be
+    combined exactly. Values are stored relative to each relay's overall mean
+    (offset) to keep the sums of squares well conditioned.
+    """
+
+    def __init__(self, fingerprints, start, step, count, total, total_sq, offset):
+        self.fingerprints = fingerprints
+        self.start = start
+        self.step = step
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.offset = offset
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    def column_times(self):
+        """Epoch seconds at the start of every column."""
+        return self.start + np.arange(self.shape[1]) * self.step
+
+    def column(self, timestamp):
+        """Index of the column boundary at or after timestamp (epoch seconds), clipped to the grid."""
+        index = int(np.ceil((timestamp - self.start) / self.step - 1e-9))
+        return min(max(index, 0), self.shape[1])
+
+    def values(self, dtype=np.float64):
+        """N×T matrix of per-cell mean bandwidth, NaN where a relay has no sample in a cell."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.total / self.count + self.offset[:, None]
+        return means.astype(dtype, copy=False)
+
+    def window_statistics(self, starts, ends):
+        """Sample count, mean, sample std and CoV per relay for column ranges [starts, ends).
+
+        Cumulative sums of each cell's count, sum and sum of squares along the
+        time axis turn every window into three subtractions per relay, so any
+        number of windows costs one pass over the matrix. Returns four
+        relays × windows arrays; std and CoV are NaN below two samples.
+        """
+        def prefix(cells):
+            return np.concatenate([np.zeros((cells.shape[0], 1)), np.cumsum(cells, axis=1)], axis=1)
+
+        starts, ends = np.asarray(starts), np.asarray(ends)
+        count, total, total_sq = prefix(self.count), prefix(self.total), prefix(self.total_sq)
+        n = count[:, ends] - count[:, starts]
+        s = total[:, ends] - total[:, starts]
+        q = total_sq[:, ends] - total_sq[:, starts]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centered_mean = s / n
+            variance = np.maximum(q - s * centered_mean, 0) / (n - 1)
+            std = np.where(n > 1, np.sqrt(variance), np.nan)
+            mean = centered_mean + self.offset[:, None]
+            cov = np.where(mean != 0, std / mean, np.nan)
+        return n.astype(np.int64), mean, std, cov
+
+def build_matrix(fingerprints, timestamps, values, start=None, end=None, step=86400, relays=None):
+    """Bin (fingerprint, epoch timestamp, value) samples into a RelayMatrix.
+
+    start and end (epoch seconds) bound the grid; by default they cover the
+    samples. Relays are sorted by fingerprint; passing a sorted relays array
+    fixes the rows instead (relays without samples get empty rows, samples of
+    other relays are dropped), so matrices built from subsets line up.
+    """
+    fingerprints = np.asarray(fingerprints, dtype=object)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    if start is None:
+        start = int(timestamps.min()) if len(timestamps) else 0
+    if end is None:
+        end = int(timestamps.max()) + 1 if len(timestamps) else start + step
+    mask = (timestamps >= start) & (timestamps < end) & ~np.isnan(values)
+    fingerprints, timestamps, values = fingerprints[mask], timestamps[mask], values[mask]
+
+    names = fingerprints.astype(str)
+    if relays is None:
+        relays, codes = np.unique(names, return_inverse=True)
+    elif len(relays):
+        relays = np.asarray(relays, dtype=str)
+        codes = np.minimum(np.searchsorted(relays, names), len(relays) - 1)
+        known = relays[codes] == names
+        codes, timestamps, values = codes[known], timestamps[known], values[known]
+    else:
+        relays, codes = np.asarray(relays, dtype=str), np.empty(0, dtype=np.int64)
+        timestamps, values = timestamps[:0], values[:0]
+    n_relays = len(relays)
+    n_columns = max(int(np.ceil((end - start) / step)), 1)
+    columns = (timestamps - start) // step
+
+    samples = np.bincount(codes, minlength=n_relays)
+    offset = np.bincount(codes, weights=values, minlength=n_relays) / np.maximum(samples, 1)
+    centered = values - offset[codes]
+    cells = codes * n_columns + columns
+    size = n_relays * n_columns
+    count = np.bincount(cells, minlength=size).reshape(n_relays, n_columns)
+    total = np.bincount(cells, weights=centered, minlength=size).reshape(n_relays, n_columns)
+    total_sq = np.bincount(cells, weights=centered ** 2, minlength=size).reshape(n_relays, n_columns)
+    return RelayMatrix(relays, start, step, count, total, total_sq, offset)
+
+def parse_timestamps(timestamps):
+    # Relays share a handful of distinct timestamps, so only the unique strings are parsed
+    import pandas as pd
+    unique, inverse = np.unique(np.asarray(timestamps, dtype=str), return_inverse=True)
+    parsed = pd.to_datetime(unique, utc=True, format='ISO8601').values.astype('datetime64[s]').astype(np.int64)
+    return parsed[inverse]
+
+def matrix_from_frame(df, start=None, end=None, step=86400, direction=None):
+    """RelayMatrix from rows shaped like relay_bandwidth_data.csv; direction selects Read or Write only."""
+    if direction is not None:
+        df = df[df['Direction'] == direction]
+    return build_matrix(df['Fingerprint'].to_numpy(), parse_timestamps(df['Timestamp'].to_numpy()),
+                        df['Value'].to_numpy(), start, end, step)
+
+def matrix_from_batches(batches, start=None, end=None, step=86400, direction=None):
+    """RelayMatrix from the columnar batches produced by fetch_data.fetch_bandwidth_batches."""
+    parts = {'Fingerprint': [], 'Timestamp': [], 'Value': []}
+    for batch in batches:
+        keep = slice(None) if direction is None else batch['Direction'] == direction
+        for name in parts:
+            parts[name].append(np.asarray(batch[name])[keep])
+    if not parts['Value']:
+        return build_matrix([], [], [], start, end, step)
+    return build_matrix(*(np.concatenate(parts[name]) for name in ('Fingerprint', 'Timestamp', 'Value')),
+                        start, end, step)
+
+def load_matrix(path, start=None, end=None, step=86400, direction=None):
+    """RelayMatrix from a relay_bandwidth_data.csv file."""
+    import pandas as pd
+    df = pd.read_csv(path, usecols=['Fingerprint', 'Timestamp', 'Direction', 'Value'])
+    return matrix_from_frame(df, start, end, step, direction)
+
+def add_matrix_arguments(parser, months_ago=2, window=True):
+    """Add the input options shared by the scripts that analyse a RelayMatrix.
+
+    Either fetch the relays in input_csv or, with --data, read an existing
+    relay_bandwidth_data.csv. window=False leaves out --months-ago and
+    --duration for scripts that choose their own window. Failures go to a
+    manifest named after the script, so fetch_data.py's is left alone.
+    """
+    parser.add_argument('input_csv', help='Relay fingerprint CSV to fetch, or bandwidth data CSV with --data.')
+    parser.add_argument('--data', action='store_true',
+                        help='input_csv is an existing relay_bandwidth_data.csv covering the window; skip fetching.')
+    if window:
+        parser.add_argument('--months-ago', type=int, default=months_ago,
+                            help='Window start, in 30-day months before now.')
+        parser.add_argument('--duration', type=int, default=1, help='Window length in 30-day months.')
+    parser.add_argument('--workers', type=int, default=5, help='Concurrent fetches.')
+    parser.add_argument('--failure-manifest', default=f'{os.path.splitext(parser.prog)[0]}_failed_fingerprints.csv',
+                        help='CSV listing relays that could not be fetched (default: %(default)s).')
+    add_query_arguments(parser, default_fields=BANDWIDTH_FIELDS)
+    add_client_arguments(parser)
+
+def window_from_args(args):
+    """(start, end) datetimes for --months-ago and --duration, as fetch_data.py computes them."""
+    from fetch_data import fetch_window
+    return fetch_window(args.months_ago, args.duration)
+
+def columns_from_args(args, window):
+    """Fingerprint, epoch timestamp, direction and value arrays from --data or from one fetch over window."""
+    if args.data:
+        import pandas as pd
+        df = pd.read_csv(args.input_csv, usecols=['Fingerprint', 'Timestamp', 'Direction', 'Value'])
+        return (df['Fingerprint'].to_numpy(), parse_timestamps(df['Timestamp'].to_numpy()),
+                df['Direction'].to_numpy(), df['Value'].to_numpy())
+
+    import fetch_data
+    from retry_queue import DeferredRetryQueue
+    fingerprints, _ = fetch_data.read_fingerprints_csv(args.input_csv)
+    retry_queue = DeferredRetryQueue()
+    parts = {'Fingerprint': [], 'Timestamp': [], 'Direction': [], 'Value': []}
+    for batch in fetch_data.fetch_bandwidth_batches(fingerprints, max_workers=args.workers,
+                                                    query_params=query_params_from_args(args),
+                                                    retry_queue=retry_queue,
+                                                    client_options=client_options_from_args(args), window=window):
+        for name in parts:
+            parts[name].append(np.asarray(batch[name]))
+    retry_queue.write_manifest(args.failure_manifest)
+    if not parts['Value']:
+        return (np.empty(0, dtype=object), np.empty(0, dtype=np.int64), np.empty(0, dtype=object), np.empty(0))
+    return tuple(np.concatenate(parts[name]) for name in parts)
+
+def matrix_from_args(args, window, grid, step, direction=None):
+    """RelayMatrix on grid (start, end epoch seconds) from the options added by add_matrix_arguments."""
+    fingerprints, timestamps, directions, values = columns_from_args(args, window)
+    if direction is not None:
+        keep = directions == direction
+        fingerprints, timestamps, values = fingerprints[keep], timestamps[keep], values[keep]
+    return build_matrix(fingerprints, timestamps, values, *grid, step)
@@ -0,0 +1,136 @@
+# streaming.py
+import heapq
+import queue
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+def _put(q, entry, stop):
+    # Blocking put that gives up once the pipeline is being torn down
+    while not stop.is_set():
+        try:
+            q.put(entry, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def run_bounded_pipeline(items, fetch, extract, sink, fetch_workers=5, extract_workers=2, queue_depth=32,
+                         ordered=False):
+    """Run fetch -> extract -> sink with bounded queues between the stages.
+
+    fetch(item) runs on fetch_workers threads and extract(item, fetched) on
+    extract_workers threads; sink(result) is called on the calling thread for
+    every result that is not None. Both hand-off queues hold at most
+    queue_depth entries, so when the sink falls behind the queues fill up,
+    put() blocks and the fetchers slow down to the sink's pace. Peak memory is
+    bounded by the queue depth rather than the number of items.
+
+    Items are pulled lazily, so items may be any iterable. With ordered=True
+    results reach the sink in the order of items; results that complete early
+    wait in a reorder buffer until everything before them has been delivered.
+    Fetchers may then run at most queue_depth items ahead of the oldest
+    undelivered one, so a stalled item cannot make the reorder buffer grow
+    without bound while the others keep completing. Returns the number of results handed to the sink.
+    """
+    items = enumerate(items)
+    items_lock = threading.Lock()
+    fetched = queue.Queue(maxsize=queue_depth)
+    extracted = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    # Ordered runs: one slot per item between being pulled and being delivered or skipped by the sink
+    ahead = threading.Semaphore(queue_depth) if ordered else None
+
+    def acquire_slot():
+        while not stop.is_set():
+            if ahead.acquire(timeout=0.1):
+                return True
+        return False
+
+    def next_item():
+        with items_lock:
+            return next(items, _DONE)
+
+    def fetcher():
+        while not stop.is_set():
+            if ahead is not None and not acquire_slot():
+                return
+            entry = next_item()
+            if entry is _DONE:
+                if ahead is not None:
+                    ahead.release()
+                return
+            seq, item = entry
+            try:
+                result = fetch(item)
+            except Exception as e:
+                log.error("Error fetching %s: %s", item, e)
+                # The sink still needs to know this position is settled when ordering
+                if not _put(extracted, (seq, None), stop):
+                    return
+                continue
+            if not _put(fetched, (seq, item, result), stop):
+                return
+
+    def extractor():
+        while not stop.is_set():
+            entry = fetched.get()
+            if entry is _DONE:
+                _put(extracted, _DONE, stop)
+                return
+            seq, item, result = entry
+            try:
+                output = extract(item, result)
+            except Exception as e:
+                log.error("Error extracting %s: %s", item, e)
+                output = None
+            if not _put(extracted, (seq, output), stop):
+                return
+
+    def close_fetched(fetch_threads):
+        for thread in fetch_threads:
+            thread.join()
+        for _ in range(extract_workers):
+            _put(fetched, _DONE, stop)
+
+    fetch_threads = [threading.Thread(target=fetcher, daemon=True) for _ in range(fetch_workers)]
+    extract_threads = [threading.Thread(target=extractor, daemon=True) for _ in range(extract_workers)]
+    for thread in fetch_threads + extract_threads:
+        thread.start()
+    threading.Thread(target=close_fetched, args=(fetch_threads,), daemon=True).start()
+
+    delivered = 0
+    finished_extractors = 0
+    next_seq = 0
+    reorder_buffer = []
+    try:
+        while finished_extractors < extract_workers:
+            entry = extracted.get()
+            if entry is _DONE:
+                finished_extractors += 1
+                continue
+            if not ordered:
+                if entry[1] is not None:
+                    sink(entry[1])
+                    delivered += 1
+                continue
+            heapq.heappush(reorder_buffer, entry)
+            while reorder_buffer and reorder_buffer[0][0] == next_seq:
+                _, output = heapq.heappop(reorder_buffer)
+                next_seq += 1
+                ahead.release()
+                if output is not None:
+                    sink(output)
+                    delivered += 1
+    finally:
+        # Unblock every worker if the sink raised or the caller was interrupted
+        stop.set()
+        for _ in range(extract_workers):
+            try:
+                fetched.put_nowait(_DONE)
+            except queue.Full:
+                break
+    return delivered
@@ -0,0 +1,88 @@
+# sweep.py
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+
+from progress import add_logging_arguments, configure_logging
+from series import add_matrix_arguments, matrix_from_args
+
+log = logging.getLogger(__name__)
+
+def month_windows(specs, now):
+    """Windows from MONTHS_AGO:DURATION specs, in the 30-day months used by fetch_data.py."""
+    windows = []
+    for spec in specs:
+        months_ago, duration = (int(part) for part in spec.split(':'))
+        start = now - timedelta(days=months_ago * 30)
+        windows.append((start, start + timedelta(days=duration * 30)))
+    return windows
+
+def sliding_windows(length_days, step_days, span_days, now):
+    """Every length_days window, advanced by step_days, that fits in the last span_days before now."""
+    windows = []
+    end = now
+    while end - timedelta(days=length_days) >= now - timedelta(days=span_days):
+        windows.append((end - timedelta(days=length_days), end))
+        end -= timedelta(days=step_days)
+    return windows[::-1]
+
+def sweep_statistics(matrix, windows):
+    """Per-relay mean, standard deviation and CoV for every window, from one RelayMatrix.
+
+    Every window is a prefix-sum lookup on the matrix (RelayMatrix.window_statistics),
+    so W windows cost one pass over the data plus O(N·W) arithmetic instead of
+    W scans. Window boundaries are rounded up to the matrix grid; they are exact
+    when they fall on column boundaries (whole days from the grid start with the
+    default step). Statistics match calculate_statistics: both directions pooled,
+    sample std.
+    """
+    import numpy as np
+    import pandas as pd
+
+    starts = [matrix.column(start.timestamp()) for start, _ in windows]
+    ends = [matrix.column(end.timestamp()) for _, end in windows]
+    n, mean, std, cov = matrix.window_statistics(starts, ends)  # relays × windows
+
+    relay_index, window_index = np.nonzero(n > 0)
+    labels = np.array([[start.isoformat(), end.isoformat()] for start, end in windows], dtype=object)
+    return pd.DataFrame({
+        "Window Start": labels[window_index, 0],
+        "Window End": labels[window_index, 1],
+        "Fingerprint": matrix.fingerprints[relay_index],
+        "Samples": n[relay_index, window_index],
+        "Mean Bandwidth": mean[relay_index, window_index],
+        "Standard Deviation": std[relay_index, window_index],
+        "Coefficient of Variation": cov[relay_index, window_index],
+    })
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compute per-relay statistics for many windows from a single fetch.')
+    parser.add_argument('--window', action='append', default=[], metavar='MONTHS_AGO:DURATION',
+                        help='Window in 30-day months, as in fetch_data.py (repeatable), e.g. 2:1.')
+    parser.add_argument('--sliding', metavar='DAYS:STEP',
+                        help='Every DAYS-long window, advanced by STEP days, within --span-days.')
+    parser.add_argument('--span-days', type=int, default=365, help='How far back --sliding windows reach.')
+    parser.add_argument('--step', type=int, default=86400, help='Grid resolution in seconds; window edges snap to it.')
+    parser.add_argument('--output', default='relay_bandwidth_sweep.csv', help='Output CSV, one row per relay and window.')
+    add_matrix_arguments(parser, window=False)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    # Whole seconds, so every window edge is a whole number of days from the grid start
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    windows = month_windows(args.window, now)
+    if args.sliding:
+        length, step = (int(part) for part in args.sliding.split(':'))
+        windows += sliding_windows(length, step, args.span_days, now)
+    if not windows:
+        windows = month_windows(['2:1'], now)  # fetch_data.py's default window
+    union = (min(start for start, _ in windows), max(end for _, end in windows))
+    grid = (int(union[0].timestamp()), int(union[1].timestamp()))
+
+    # One fetch covering every window
+    matrix = matrix_from_args(args, union, grid, args.step)
+
+    results = sweep_statistics(matrix, windows)
+    results.to_csv(args.output, index=False)
+    log.info("Saved statistics for %d relays over %d windows to '%s'.", len(matrix.fingerprints), len(windows), args.output)
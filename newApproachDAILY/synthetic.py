@@ -0,0 +1,126 @@
+# synthetic.py
+import argparse
+import gzip
+import hashlib
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Granularity blocks as published in Onionoo bandwidth documents: (name, interval seconds, span seconds)
+GRANULARITY_BLOCKS = [
+    ('1_month', 4 * 3600, 31 * 86400),
+    ('6_months', 12 * 3600, 183 * 86400),
+    ('1_year', 2 * 86400, 366 * 86400),
+    ('5_years', 10 * 86400, 5 * 366 * 86400),
+]
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+def relay_fingerprint(index, seed=0):
+    return hashlib.sha1(f"{seed}:{index}".encode()).hexdigest().upper()
+
+def relay_profile(index, seed=0):
+    """Deterministic traffic parameters for one synthetic relay."""
+    rng = np.random.default_rng([seed, index])
+    return {
+        'base': float(rng.lognormal(mean=14.0, sigma=1.5)),  # bytes/s, roughly 100 KB/s to tens of MB/s
+        'diurnal': float(rng.uniform(0.0, 0.6)),
+        'weekly': float(rng.uniform(0.0, 0.2)),
+        'phase': float(rng.uniform(0, 2 * np.pi)),
+        'noise': float(rng.uniform(0.02, 0.4)),
+        'burst_rate': float(rng.choice([0.0, 0.0, 0.01, 0.05])),
+        'gap_rate': float(rng.choice([0.0, 0.0, 0.02, 0.1])),
+        'running': bool(rng.random() > 0.1),
+        'consensus_weight': int(rng.lognormal(mean=8.0, sigma=1.5)),
+    }
+
+def history_block(profile, rng, last, interval, span, read_ratio=1.0):
+    # Average the diurnal/weekly cycles over the interval so coarse blocks flatten them
+    # like Onionoo's aggregation does
+    count = span // interval
+    starts = last.timestamp() - (count - 1) * interval + np.arange(count) * interval
+    day = 2 * np.pi * starts / 86400
+    week = 2 * np.pi * starts / (7 * 86400)
+    damp_day = np.sinc(interval / 86400)
+    damp_week = np.sinc(interval / (7 * 86400))
+    series = profile['base'] * read_ratio * (
+        1
+        + profile['diurnal'] * damp_day * np.sin(day + profile['phase'])
+        + profile['weekly'] * damp_week * np.sin(week + profile['phase'])
+        + profile['noise'] * rng.standard_normal(count) / np.sqrt(max(1, interval / 14400))
+    )
+    bursts = rng.random(count) < profile['burst_rate']
+    series[bursts] *= rng.uniform(2, 6, bursts.sum())
+    series = np.clip(series, 0, None)
+
+    factor = series.max() / 999 if series.max() > 0 else 1.0
+    values = np.rint(series / factor).astype(int).tolist()
+    for i in np.flatnonzero(rng.random(count) < profile['gap_rate']):
+        values[i] = None
+    first = datetime.fromtimestamp(starts[0], timezone.utc)
+    return {
+        'first': first.strftime('%Y-%m-%d %H:%M:%S'),
+        'last': last.strftime('%Y-%m-%d %H:%M:%S'),
+        'interval': interval,
+        'factor': factor,
+        'count': count,
+        'values': values,
+    }
+
+def bandwidth_document(index, seed=0, now=None):
+    """Onionoo bandwidth relay object for synthetic relay number index."""
+    now = now or datetime.now(timezone.utc)
+    profile = relay_profile(index, seed)
+    rng = np.random.default_rng([seed, index, 1])
+    document = {'fingerprint': relay_fingerprint(index, seed)}
+    for key, read_ratio in (('write_history', 1.0), ('read_history', 1.02)):
+        history = {}
+        for name, interval, span in GRANULARITY_BLOCKS:
+            # Blocks end on an interval boundary shortly before now, as Onionoo's do
+            last = datetime.fromtimestamp(now.timestamp() // interval * interval - interval, timezone.utc)
+            history[name] = history_block(profile, rng, last, interval, span, read_ratio)
+        document[key] = history
+    return document
+
+def summary_entry(index, seed=0):
+    profile = relay_profile(index, seed)
+    return {'n': f"synthetic{index}", 'f': relay_fingerprint(index, seed), 'a': [], 'r': profile['running']}
+
+def details_entry(index, seed=0):
+    profile = relay_profile(index, seed)
+    return {
+        'fingerprint': relay_fingerprint(index, seed),
+        'running': profile['running'],
+        'consensus_weight': profile['consensus_weight'],
+        'advertised_bandwidth': int(profile['base'] * 1.5),
+    }
+
+def write_dataset(relays, output, seed=0, now=None):
+    """Write relays bandwidth documents as gzipped JSON lines plus a matching fingerprint CSV."""
+    now = now or datetime.now(timezone.utc)
+    with gzip.open(output, 'wt') as f:
+        for index in range(relays):
+            f.write(json.dumps(bandwidth_document(index, seed, now)) + '\n')
+    fingerprints_csv = output.replace('.jsonl.gz', '') + '_fingerprints.csv'
+    pd.DataFrame({'Fingerprint': [relay_fingerprint(i, seed) for i in range(relays)]}).to_csv(fingerprints_csv, index=False)
+    print(f"Wrote {relays} synthetic relays to {output} and {fingerprints_csv}")
+
+def read_dataset(path):
+    """Yield bandwidth relay objects from a file written by write_dataset."""
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            yield json.loads(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic Onionoo bandwidth histories.')
+    parser.add_argument('--size', choices=sorted(SIZES), help='Preset number of relays.')
+    parser.add_argument('--relays', type=int, help='Number of relays (overrides --size).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed; the same seed always produces the same relays.')
+    parser.add_argument('--output', help='Output .jsonl.gz file (default synthetic_<size>.jsonl.gz).')
+    args = parser.parse_args()
+
+    relays = args.relays or SIZES[args.size or '1k']
+    output = args.output or f"synthetic_{args.size or relays}.jsonl.gz"
+    write_dataset(relays, output, seed=args.seed)
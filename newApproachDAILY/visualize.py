@@ -1,10 +1,10 @@
 # visualize.py
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 import argparse
+from profiling import PROFILER, add_profile_arguments, finish_profiling, start_profiling
 
-def plot_cdf(data, column, xlabel, title, x_units=None, x_limit=None, x_ticks=None, hline_y=None):
+def plot_cdf(data, column, xlabel, title, x_units=None, x_limit=None, x_ticks=None, hline_y=None, output_file=None):
+    import numpy as np
+    import matplotlib.pyplot as plt  # Imported here so the pipeline only pays for it when plotting
     # Drop rows with missing values
     data = data.dropna(subset=[column])
 
@@ -38,20 +38,20 @@ def plot_cdf(data, column, xlabel, title, x_units=None, x_limit=None, x_ticks=No
         plt.axhline(y=hline_y, color='red', linestyle='--', label=f'y = {hline_y}')
         plt.legend()
 
-    plt.show()
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Visualize relay bandwidth statistics.')
-    parser.add_argument('input_csv', help='Input CSV file containing statistics data.')
-    args = parser.parse_args()
-
-    # Load statistics data
-    data = pd.read_csv(args.input_csv)
+    # Save to file when an output path is given, otherwise display interactively
+    if output_file:
+        plt.savefig(output_file)
+        plt.close()
+    else:
+        plt.show()
 
+def plot_relay_statistics(data, cov_x_max=2.0, cov_tick_step=0.2, std_num_ticks=10, hline_y=0.5,
+                          cov_output=None, std_output=None):
+    import numpy as np
     # Plot CDF of Coefficient of Variation with styling changes
-    # Limit x-axis to 0 - 2 and set x-axis ticks at regular intervals
-    x_limit_cov = [0, 2]
-    x_ticks_cov = np.arange(0, 2.1, 0.2)  # Ticks every 0.2 units from 0 to 2
+    # Limit x-axis to 0 - cov_x_max and set x-axis ticks at regular intervals
+    x_limit_cov = [0, cov_x_max]
+    x_ticks_cov = np.arange(0, cov_x_max + cov_tick_step / 2, cov_tick_step)
 
     plot_cdf(
         data,
@@ -61,7 +61,8 @@ if __name__ == "__main__":
         x_units='Unitless',
         x_limit=x_limit_cov,
         x_ticks=x_ticks_cov,
-        hline_y=0.5  # Add horizontal line at y=0.5
+        hline_y=hline_y,
+        output_file=cov_output
     )
 
     # Plot CDF of Standard Deviation with units and grid lines
@@ -69,7 +70,7 @@ if __name__ == "__main__":
     std_data = data['Standard Deviation'].dropna()
     std_max = std_data.max()
     x_limit_std = [0, std_max]
-    x_ticks_std = np.linspace(0, std_max, num=10)  # 10 ticks from 0 to max
+    x_ticks_std = np.linspace(0, std_max, num=std_num_ticks)
 
     plot_cdf(
         data,
@@ -78,5 +79,23 @@ if __name__ == "__main__":
         'CDF of Standard Deviation for Relay Bandwidths',
         x_units='Bytes/sec',
         x_limit=x_limit_std,
-        x_ticks=x_ticks_std
+        x_ticks=x_ticks_std,
+        output_file=std_output
     )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Visualize relay bandwidth statistics.')
+    parser.add_argument('input_csv', help='Input CSV file containing statistics data.')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+    import pandas as pd
+
+    # Load statistics data
+    with PROFILER.stage('read'):
+        data = pd.read_csv(args.input_csv)
+
+    # Limit x-axis to 0 - 2 with ticks every 0.2 units for CoV, 10 ticks for standard deviation
+    with PROFILER.stage('plot'):
+        plot_relay_statistics(data)
+    finish_profiling(args)